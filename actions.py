@@ -4,6 +4,7 @@ from typing import Optional, Tuple, TYPE_CHECKING
 
 from components import consumable
 from graphics import color
+from message_log import MessageTemplate
 import exceptions
 
 if TYPE_CHECKING:
@@ -12,6 +13,8 @@ if TYPE_CHECKING:
 
 
 class Action:
+    __slots__ = ("entity",)
+
     def __init__(self, entity: Actor) -> None:
         super().__init__()
         self.entity = entity
@@ -35,6 +38,7 @@ class Action:
 
 class PickupAction(Action):
     """Pickup an item and add it to the inventory, if there is room for it."""
+    __slots__ = ()
 
     def __init__(self, entity: Actor):
         super().__init__(entity)
@@ -44,17 +48,16 @@ class PickupAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                if len(inventory.items) >= inventory.capacity:
-                    raise exceptions.Impossible("Your inventory is full.")
+        for item in self.engine.game_map.get_items_at_location(actor_location_x, actor_location_y):
+            if len(inventory.items) >= inventory.capacity:
+                raise exceptions.Impossible("Your inventory is full.")
 
-                self.engine.game_map.entities.remove(item)
-                item.parent = self.entity.inventory
-                inventory.items.append(item)
+            self.engine.game_map.remove_entity(item)
+            item.parent = self.entity.inventory
+            inventory.items.append(item)
 
-                self.engine.message_log.add_message(f"You picked up the {item.name}!")
-                return
+            self.engine.message_log.add_message(f"You picked up the {item.name}!")
+            return
 
         raise exceptions.Impossible("There is nothing here to pick up.")
 
@@ -64,6 +67,9 @@ class PickupSuppliesAction(Action):
     Base class for EnemyPickupSuppliesAction & FriendlyPickupSuppliesAction.
     Do not use this class itself.
     """
+
+    __slots__ = ("value",)
+
     def __init__(self, entity: Actor, supplies_value: int):
         super().__init__(entity)
         self.value = supplies_value
@@ -90,6 +96,8 @@ class EnemyPickupSuppliesAction(PickupSuppliesAction):
 
     """
 
+    __slots__ = ()
+
     def perform(self) -> None:
         self.engine.enemy_add_supplies(self.value)
 
@@ -99,11 +107,15 @@ class FriendlyPickupSuppliesAction(PickupSuppliesAction):
     Add supply_item to the friendly supply_item in engine.
     """
 
+    __slots__ = ()
+
     def perform(self) -> None:
         self.engine.friendly_add_supplies(self.value)
 
 
 class ItemAction(Action):
+    __slots__ = ("item", "target_xy")
+
     def __init__(
             self, entity: Actor, item: Item, target_xy: Optional[Tuple[int, int]] = None
     ):
@@ -125,6 +137,8 @@ class ItemAction(Action):
 
 
 class DropItem(ItemAction):
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.entity.equipment.item_is_equipped(self.item):
             self.entity.equipment.toggle_equip(self.item)
@@ -132,6 +146,8 @@ class DropItem(ItemAction):
 
 
 class EquipAction(Action):
+    __slots__ = ("item",)
+
     def __init__(self, entity: Actor, item: Item):
         super().__init__(entity)
 
@@ -142,11 +158,15 @@ class EquipAction(Action):
 
 
 class WaitAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         pass
 
 
 class TakeStairsAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         """
         Take the stairs, if any exist at the entity's location.
@@ -161,6 +181,8 @@ class TakeStairsAction(Action):
 
 
 class ActionWithDirection(Action):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
 
@@ -187,6 +209,8 @@ class ActionWithDirection(Action):
 
 
 class MeleeAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         target = self.target_actor
         if not target:
@@ -194,24 +218,22 @@ class MeleeAction(ActionWithDirection):
 
         damage = self.entity.fighter.power - target.fighter.defense
 
-        attack_desc = f"{self.entity.name.capitalize()} attacks {target.name}"
         if self.entity is self.engine.player:
             attack_color = color.player_atk
         else:
             attack_color = color.enemy_atk
 
+        args = (self.entity.name.capitalize(), target.name)
         if damage > 0:
-            self.engine.message_log.add_message(
-                f"{attack_desc} for {damage} hit points.", attack_color
-            )
+            self.engine.message_log.add_template(MessageTemplate.ATTACK, args + (damage,), attack_color)
             target.fighter.hp -= damage
         else:
-            self.engine.message_log.add_message(
-                f"{attack_desc} but does no damage.", attack_color
-            )
+            self.engine.message_log.add_template(MessageTemplate.ATTACK_NO_DAMAGE, args, attack_color)
 
 
 class MovementAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         dest_x, dest_y = self.dest_xy
 
@@ -234,6 +256,8 @@ class PlayerMovementAction(ActionWithDirection):
     Really we just want to constrain them inside the game window
     """
 
+    __slots__ = ()
+
     def perform(self) -> None:
         dest_x, dest_y = self.dest_xy
 
@@ -251,6 +275,8 @@ class BumpAction(ActionWithDirection):
     This is not solely used by the player
     """
 
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.target_actor:
             return MeleeAction(self.entity, self.dx, self.dy).perform()
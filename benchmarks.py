@@ -0,0 +1,203 @@
+"""
+Rough benchmarks for the hot paths of the game. These are not run by the game itself.
+Run from the project root with:
+
+```
+python benchmarks.py
+```
+"""
+from __future__ import annotations
+
+import copy
+import random
+import time
+import tracemalloc
+from typing import List, Tuple
+
+import numpy as np
+
+import entity_factories
+import procgen
+from components.ai import new_pathfinder
+from engine import Engine
+from game_map import GameMap
+from game_world import GameWorld
+
+
+def new_engine(map_width: int = 80, map_height: int = 43) -> Engine:
+    """
+    Build an engine and game world with the same settings as setup_game.new_game, without generating a floor.
+    """
+    player = entity_factories.player.clone()
+    engine = Engine(player=player)
+    engine.game_world = GameWorld(
+        engine=engine,
+        max_rooms=30,
+        room_min_size=6,
+        room_max_size=10,
+        map_width=map_width,
+        map_height=map_height,
+    )
+    return engine
+
+
+def new_padded_map(engine: Engine) -> GameMap:
+    """Generate a map the same way generate_dungeon does, minus the spawn rooms."""
+    world = engine.game_world
+    return procgen.padded_generation(
+        max_rooms=world.max_rooms,
+        room_min_size=world.room_min_size,
+        room_max_size=world.room_max_size,
+        map_width=world.map_width,
+        map_height=world.map_height,
+        engine=engine,
+        padding_total=world.map_height // 2,
+    )
+
+
+def benchmark_pathfinding(maps: int = 20, searches: int = 50) -> None:
+    """
+    Compare the plain Dijkstra search against the A* mode of get_path_to on padded_generation maps.
+    The same start and goal pairs are used for both. Nodes reached is every tile the search gave a distance to.
+    """
+    cases: List[Tuple[np.ndarray, Tuple[int, int], Tuple[int, int]]] = []
+    engine = new_engine()
+    for _ in range(maps):
+        game_map = new_padded_map(engine)
+        cost = game_map.build_path_cost()
+        walkable = np.argwhere(cost > 0)
+        for _ in range(searches):
+            start, goal = random.sample(range(len(walkable)), 2)
+            cases.append((cost, tuple(walkable[start]), tuple(walkable[goal])))
+
+    print(f"Pathfinding over {len(cases)} searches on {maps} padded maps")
+    for name, heuristic in (("dijkstra", False), ("a*", True)):
+        nodes = 0
+        elapsed = 0.0
+        for cost, start, goal in cases:
+            began = time.perf_counter()
+            pathfinder = new_pathfinder(cost, start, heuristic)
+            pathfinder.path_to(goal)
+            elapsed += time.perf_counter() - began
+            distance = pathfinder.distance
+            nodes += int(np.count_nonzero(distance != np.iinfo(distance.dtype).max))
+        print(
+            f"  {name:>8}: {nodes / len(cases):8.1f} nodes reached per search, "
+            f"{elapsed / len(cases) * 1000:.3f} ms per search"
+        )
+
+
+def benchmark_descent(floors: int = 10) -> None:
+    """
+    Compare how long GameWorld.generate_floor() takes when it generates the floor itself against handing over a
+    floor pregenerated in the worker process. The worker is given time to finish before each pregenerated descent.
+    """
+    print(f"Descent latency over {floors} floors")
+    for name, pregenerate in (("sync", False), ("pregen", True)):
+        engine = new_engine()
+        world = engine.game_world
+        world.pregenerate = pregenerate
+        world.generate_floor()
+        elapsed = 0.0
+        for _ in range(floors):
+            if world.next_floor is not None:
+                world.next_floor.result()
+            world.generate_floor()
+            elapsed += world.last_descent_time
+        print(f"  {name:>8}: {elapsed / floors * 1000:.3f} ms per descent")
+
+
+def benchmark_room_placement(map_size: int = 1000, attempts: int = 1500) -> None:
+    """
+    Compare placing rooms with procgen.RoomPlacer against testing each random candidate against every room with
+    RectangularRoom.intersects(), on a large square map. Both make the same number of attempts with the room sizes
+    new_game uses, and the placer also checks the smallest room still fits after each miss, as generation does.
+    """
+    print(f"Room placement over {attempts} attempts on a {map_size}x{map_size} map")
+    sizes = [(random.randint(6, 10), random.randint(6, 10)) for _ in range(attempts)]
+
+    began = time.perf_counter()
+    rooms: List[procgen.RectangularRoom] = []
+    for room_width, room_height in sizes:
+        x = random.randint(0, map_size - room_width - 1)
+        y = random.randint(0, map_size - room_height - 1)
+        new_room = procgen.RectangularRoom(x, y, room_width, room_height)
+        if not any(new_room.intersects(other) for other in rooms):
+            rooms.append(new_room)
+    elapsed = time.perf_counter() - began
+    print(f"  {'pairwise':>8}: {len(rooms):6d} rooms, {elapsed / attempts * 1000:.3f} ms per attempt")
+
+    began = time.perf_counter()
+    placer = procgen.RoomPlacer(map_size, map_size)
+    for room_width, room_height in sizes:
+        position = placer.find_position(room_width, room_height)
+        if position is None:
+            if not placer.fits(6, 6):
+                break
+            continue
+        placer.add(procgen.RectangularRoom(*position, room_width, room_height))
+    elapsed = time.perf_counter() - began
+    print(f"  {'placer':>8}: {len(placer.rooms):6d} rooms, {elapsed / attempts * 1000:.3f} ms per attempt")
+
+
+def benchmark_spawning(count: int = 20000) -> None:
+    """
+    Compare how many copies per second Entity.clone(), which spawn() uses, makes against copy.deepcopy for the
+    entities place_entities spawns most.
+    """
+    print(f"Spawn throughput over {count} copies")
+    for prototype in (entity_factories.orc, entity_factories.supplies):
+        prototype.clone()  # Compile the prototype outside the timing
+        for name, make_copy in (("deepcopy", copy.deepcopy), ("clone", type(prototype).clone)):
+            began = time.perf_counter()
+            for _ in range(count):
+                make_copy(prototype)
+            elapsed = time.perf_counter() - began
+            print(f"  {prototype.name:>8} {name:>8}: {count / elapsed:10.0f} copies per second")
+
+
+def benchmark_memory(actors: int = 3000, turns: int = 20) -> None:
+    """
+    Fill a large open floor with orcs and report the memory each one takes, then the memory allocated on top of
+    that while the actors take their turns. tracemalloc only sees live blocks, so per turn the peak is reported,
+    the most that was allocated at once during the turn.
+    """
+    engine = new_engine(200, 200)
+    game_map = GameMap(engine, 200, 200)
+    game_map.set_tiles((slice(1, 199), slice(1, 199)), procgen.tile_room_types.floor)
+    engine.game_map = game_map
+    engine.player.place(1, 1, game_map)
+    entity_factories.orc.clone()  # Compile the prototype outside the measurement
+    positions = random.sample([(x, y) for x in range(2, 199) for y in range(2, 199)], actors)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for x, y in positions:
+        entity_factories.orc.spawn(game_map, x, y)
+    per_actor = (tracemalloc.get_traced_memory()[0] - before) / actors
+
+    before = tracemalloc.get_traced_memory()[0]
+    clones = [entity_factories.orc.clone() for _ in range(actors)]
+    per_object = (tracemalloc.get_traced_memory()[0] - before) / actors
+    del clones
+
+    peak = 0
+    for _ in range(turns):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        engine.handle_entity_turns()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    print(f"Memory with {actors} actors")
+    print(f"  {per_object:8.0f} bytes per actor and its components")
+    print(f"  {per_actor:8.0f} bytes per spawned actor, including its map bookkeeping")
+    print(f"  {peak / turns / 1024:8.1f} KiB peak allocated per turn")
+
+
+if __name__ == "__main__":
+    benchmark_pathfinding()
+    benchmark_descent()
+    benchmark_room_placement()
+    benchmark_spawning()
+    benchmark_memory()
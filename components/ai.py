@@ -9,9 +9,41 @@ import tcod
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction, EnemyPickupSuppliesAction
 # from components.consumable import Supplies, Consumable
 import components.consumable
+from config import FOV_RADIUS
 
 if TYPE_CHECKING:
-    from entity import Actor, Entity
+    from entity import Actor, Entity, Item
+
+# Every direction an actor can step in
+DIRECTIONS: List[Tuple[int, int]] = [
+    (-1, -1),  # Northwest
+    (0, -1),  # North
+    (1, -1),  # Northeast
+    (-1, 0),  # West
+    (1, 0),  # East
+    (-1, 1),  # Southwest
+    (0, 1),  # South
+    (1, 1),  # Southeast
+]
+
+
+def new_pathfinder(cost: np.ndarray, start: Tuple[int, int], heuristic: bool = True) -> tcod.path.Pathfinder:
+    """
+    Create a pathfinder over the cost grid rooted at start, using cardinal=2 and diagonal=3 step costs.
+    If heuristic is True the search is goal directed (A*). The heuristic uses the same weights as the steps and
+    no tile costs less than 1 so it never overestimates and paths stay optimal.
+    Otherwise it is a plain Dijkstra search that floods outwards until it reaches the goal.
+    """
+    # Create a graph from the cost array and pass that graph to a new pathfinder.
+    graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
+    # SimpleGraph sets up this same heuristic by default, so be explicit about which search we want
+    if heuristic:
+        graph.set_heuristic(cardinal=2, diagonal=3)
+    else:
+        graph.set_heuristic(cardinal=0, diagonal=0)
+    pathfinder = tcod.path.Pathfinder(graph)
+    pathfinder.add_root(start)  # Start position.
+    return pathfinder
 
 
 class BaseAI(Action):
@@ -22,6 +54,16 @@ class BaseAI(Action):
     When extending this class the first step is implementing perform(). This defines what the entity will actually do
     """
 
+    __slots__ = ()
+
+    # Use a goal directed A* search in get_path_to(). When False a plain Dijkstra search floods outwards instead
+    path_heuristic: bool = True
+    # Plan over the map's room graph first and only search the grid of the current and next room.
+    # Worth turning on for maps much bigger than the default 80x43
+    path_hierarchical: bool = False
+    # How far the actor can see, through GameMap.perception. None for AIs that don't look around
+    sight_radius: Optional[int] = None
+
     def perform(self) -> None:
         raise NotImplementedError()
 
@@ -30,27 +72,61 @@ class BaseAI(Action):
 
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        if self.path_hierarchical:
+            path = self.get_room_path_to(dest_x, dest_y)
+            if path:
+                return path
+
+        # The map keeps the walkable tiles plus blocking entity costs up to date for us
+        cost = self.entity.gamemap.get_path_cost()
+        pathfinder = new_pathfinder(cost, (self.entity.x, self.entity.y), self.path_heuristic)
 
-        for entity in self.entity.gamemap.entities:
-            # Check that an entity blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+        # Compute the path to the destination and remove the starting point
+        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
 
-            # Create a graph from the cost array and pass that graph to a new pathfinder.
-            graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-            pathfinder = tcod.path.Pathfinder(graph)
-            pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        return [(index[0], index[1]) for index in path]
 
-            # Compute the path to the destination and remove the starting point
-            path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+    def get_room_path_to(self, dest_x: int, dest_y: int) -> Optional[List[Tuple[int, int]]]:
+        """
+        Hierarchical version of get_path_to(). Finds the route through the room graph then only searches the grid
+        covering the current room and the next one, returning a path to the next room's center (or to the
+        destination once it is in the same room). Tunnels between linked rooms always run between their centers
+        so they lie inside that area.
 
-            return [(index[0], index[1]) for index in path]
+        Returns None if either end isn't inside a known room or no route is found, get_path_to() then falls back to
+        searching the whole map.
+        """
+        gamemap = self.entity.gamemap
+        start_room = gamemap.get_room_at(self.entity.x, self.entity.y)
+        goal_room = gamemap.get_room_at(dest_x, dest_y)
+        if start_room < 0 or goal_room < 0:
+            return None
+
+        if start_room == goal_room:
+            next_room = goal_room
+        else:
+            route = gamemap.get_room_route(start_room, goal_room)
+            if not route:
+                return None
+            next_room = route[1]
+
+        if next_room == goal_room:
+            waypoint = dest_x, dest_y
+        else:
+            waypoint = gamemap.rooms[next_room].center
+
+        current, following = gamemap.rooms[start_room], gamemap.rooms[next_room]
+        x1, y1 = min(current.x1, following.x1), min(current.y1, following.y1)
+        x2, y2 = max(current.x2, following.x2), max(current.y2, following.y2)
+
+        # A slice of the cost grid is a view so this costs nothing to set up
+        cost = gamemap.get_path_cost()[x1: x2 + 1, y1: y2 + 1]
+        pathfinder = new_pathfinder(cost, (self.entity.x - x1, self.entity.y - y1), self.path_heuristic)
+        path: List[List[int]] = pathfinder.path_to((waypoint[0] - x1, waypoint[1] - y1))[1:].tolist()
+        if not path:
+            return None
+
+        return [(index[0] + x1, index[1] + y1) for index in path]
 
 
 class HostileEnemy(BaseAI):
@@ -59,9 +135,51 @@ class HostileEnemy(BaseAI):
         NOTE: an enemies bump attack is defined here
     """
 
+    __slots__ = ("path", "path_origin", "path_target", "path_version")
+
+    # As far as the player sees, so an enemy in the player's view can also see the player
+    sight_radius: Optional[int] = FOV_RADIUS
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
+        # Where the stored path was planned from, what it leads to and the map's tiles_version at the time
+        self.path_origin: Optional[Tuple[int, int]] = None
+        self.path_target: Optional[Tuple[int, int]] = None
+        self.path_version: int = -1
+
+    def path_is_valid(self, dest_x: int, dest_y: int) -> bool:
+        """
+        Cheap check that the stored path can still be followed to the destination.
+        Only the next step is looked at, the rest of the path is trusted until the map changes.
+        """
+        gamemap = self.entity.gamemap
+        if self.path_target != (dest_x, dest_y) or self.path_version != gamemap.tiles_version:
+            return False
+        if not self.path:
+            # No route was found last time. That only changes with the tiles, the target or our own position
+            return self.path_origin == (self.entity.x, self.entity.y)
+
+        next_x, next_y = self.path[0]
+        if max(abs(next_x - self.entity.x), abs(next_y - self.entity.y)) != 1:
+            return False  # We have been moved off the path
+        return not gamemap.blockers[next_x, next_y]
+
+    def update_path(self, dest_x: int, dest_y: int) -> None:
+        """Keep the stored path if it is still valid, otherwise search for a new one."""
+        if self.path_is_valid(dest_x, dest_y):
+            self.engine.path_cache_hits += 1
+            return
+
+        self.engine.path_cache_misses += 1
+        self.path = self.get_path_to(dest_x, dest_y)
+        self.path_origin = self.entity.x, self.entity.y
+        self.path_target = dest_x, dest_y
+        self.path_version = self.entity.gamemap.tiles_version
+
+    def can_see(self, x: int, y: int) -> bool:
+        """Whether this actor can see the tile x, y from where it stands."""
+        return self.entity.gamemap.perception.can_see(self.entity.x, self.entity.y, self.sight_radius, x, y)
 
     def perform(self) -> None:
         target = self.engine.player
@@ -69,13 +187,12 @@ class HostileEnemy(BaseAI):
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
-            # our first hack attempt
+        if self.can_see(target.x, target.y):
             if distance == 0:
                 return None
             if distance <= 1:
                 return MeleeAction(self.entity, dx, dy).perform()
-            self.path = self.get_path_to(target.x, target.y)
+            self.update_path(target.x, target.y)
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
@@ -91,6 +208,11 @@ class EnemySupplyScavenger(HostileEnemy):
         Basically the HostileEnemy but will go for the nearest supply_item instead of the player
     """
 
+    __slots__ = ()
+
+    # Follows the supply distance field rather than looking for anything
+    sight_radius = None
+
     def get_target(self) -> Optional[Item]:
         """
         Get the nearest supply_item to target_class
@@ -110,36 +232,56 @@ class EnemySupplyScavenger(HostileEnemy):
         # add the supply_item to the tally
         EnemyPickupSuppliesAction(self.entity, supply_item.consumable.value)
         # remove from the map
-        self.engine.game_map.entities.remove(supply_item)
+        self.engine.game_map.remove_entity(supply_item)
+        # A source of the shared distance field is gone so rebuild it for the rest of the turn
+        self.engine.supply_distances = self.engine.game_map.get_supply_distances()
+
+    def get_downhill_step(self, distances: np.ndarray) -> Optional[Tuple[int, int]]:
+        """
+        Find the neighbouring tile that is closest to a supply_item according to the shared distance field.
+        Tiles blocked by another entity are skipped so scavengers flow around each other.
+        :param distances: the supply distance field from GameMap.get_supply_distances()
+        :return: The (x, y) to step to. None if no neighbour is closer than the current tile
+        """
+        gamemap = self.entity.gamemap
+        best_distance = distances[self.entity.x, self.entity.y]
+        step = None
+
+        for dx, dy in DIRECTIONS:
+            x = self.entity.x + dx
+            y = self.entity.y + dy
+            if not gamemap.in_bounds(x, y) or distances[x, y] >= best_distance:
+                continue
+            if gamemap.get_blocking_entity_at_location(x, y):
+                continue
+            best_distance = distances[x, y]
+            step = x, y
+
+        return step
 
     def perform(self) -> None:
-        # Get the nearest supply_item
-        # Grab them if they are within reach
-        target = self.engine.game_map.get_closest_consumable(
-            self.entity, components.consumable.Supplies
+        # Walk downhill on the distance field the engine computed for this turn
+        # Grab the supply_item once we are standing on it
+        distances = self.engine.supply_distances
+        if distances is None:
+            distances = self.engine.supply_distances = self.engine.game_map.get_supply_distances()
+
+        if distances[self.entity.x, self.entity.y] == 0:
+            target = self.engine.game_map.get_consumable_at_location(
+                self.entity.x, self.entity.y, components.consumable.Supplies
             )
-        #target = self.get_target()  # this also gets the chebyshev dist
-        if target is None:
-            return None
+            if target is not None:
+                return self.get_supplies(target)
 
-        dx = target.x - self.entity.x
-        dy = target.y - self.entity.y
-        distance = max(abs(dx), abs(dy))  # Chebyshev distance
-
-        # if self.engine.game_map.visible[self.entity.x, self.entity.y]:
-        if distance == 0:
-            # grab the supply_item I suppose
-            return self.get_supplies(target)
-
-        self.path = self.get_path_to(target.x, target.y)
+        step = self.get_downhill_step(distances)
 
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
+        if step:
+            dest_x, dest_y = step
             return MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y
             ).perform()
 
-        # This is the safety return
+        # This is the safety return. Also covers there being no reachable supply_item left
         return WaitAction(self.entity).perform()
 
 
@@ -149,6 +291,8 @@ class ConfusedEnemy(BaseAI):
     If an actor occupies a tile it is randomly moving into, it will attack.
     """
 
+    __slots__ = ("previous_ai", "turns_remaining")
+
     def __init__(
             self, entity: Actor, previous_ai: Optional[BaseAI], turns_remaining: int
     ):
@@ -165,18 +309,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
-                [
-                    (-1, -1),  # Northwest
-                    (0, -1),  # North
-                    (1, -1),  # Northeast
-                    (-1, 0),  # West
-                    (1, 0),  # East
-                    (-1, 1),  # Southwest
-                    (0, 1),  # South
-                    (1, 1),  # Southeast
-                ]
-            )
+            direction_x, direction_y = random.choice(DIRECTIONS)
 
             self.turns_remaining -= 1
             # The actor will either try to move or attack in the chosen random direction.
@@ -8,6 +8,7 @@ import components.inventory
 #import components.ai
 from components.base_components import BaseComponent
 from exceptions import Impossible
+from kind import Kind, KindAttribute
 #from input_handlers import (
 #    ActionOrHandler,
 #    SingleRangedAttackHandler,
@@ -19,6 +20,8 @@ if TYPE_CHECKING:
 
 
 class Consumable(BaseComponent):
+    __slots__ = ("kind", "overrides")
+
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ih.ActionOrHandler]:
@@ -45,8 +48,14 @@ class Supplies(Consumable):
     The supply_item that everyone is trying to capture
     For now it just has a is supply_item func because I'm lazy
     """
+
+    __slots__ = ()
+
+    value = KindAttribute()
+
     def __init__(self, value: int = 1):
-        self.value = value
+        self.kind = Kind(value=value)
+        self.overrides = None
 
     def activate(self, action: actions.ItemAction) -> None:
         pass
@@ -57,8 +66,13 @@ class Supplies(Consumable):
 
 
 class HealingConsumable(Consumable):
+    __slots__ = ()
+
+    amount = KindAttribute()
+
     def __init__(self, amount: int):
-        self.amount = amount
+        self.kind = Kind(amount=amount)
+        self.overrides = None
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
@@ -75,22 +89,24 @@ class HealingConsumable(Consumable):
 
 
 class LightningDamageConsumable(Consumable):
+    __slots__ = ()
+
+    damage = KindAttribute()
+    maximum_range = KindAttribute()
+
     def __init__(self, damage: int, maximum_range: int):
-        self.damage = damage
-        self.maximum_range = maximum_range
+        self.kind = Kind(damage=damage, maximum_range=maximum_range)
+        self.overrides = None
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
+        store = self.engine.game_map.entity_store
 
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        # The closest living actor in view that isn't the consumer
+        candidates = store.live_actors_mask() & store.in_fov_mask(self.parent.gamemap.visible)
+        if consumer.store is store:
+            candidates[consumer.store_id] = False
+        target = store.nearest(consumer.x, consumer.y, candidates, self.maximum_range + 1.0)
 
         if target:
             self.engine.message_log.add_message(
@@ -103,8 +119,13 @@ class LightningDamageConsumable(Consumable):
 
 
 class ConfusionConsumable(Consumable):
+    __slots__ = ()
+
+    number_of_turns = KindAttribute()
+
     def __init__(self, number_of_turns: int) -> Optional[actions.Action]:
-        self.number_of_turns = number_of_turns
+        self.kind = Kind(number_of_turns=number_of_turns)
+        self.overrides = None
 
     def get_action(self, consumer: Actor) -> ih.SingleRangedAttackHandler:
         self.engine.message_log.add_message(
@@ -137,9 +158,14 @@ class ConfusionConsumable(Consumable):
 
 
 class FireballDamageConsumable(Consumable):
+    __slots__ = ()
+
+    damage = KindAttribute()
+    radius = KindAttribute()
+
     def __init__(self, damage: int, radius: int):
-        self.damage = damage
-        self.radius = radius
+        self.kind = Kind(damage=damage, radius=radius)
+        self.overrides = None
 
     def get_action(self, consumer: Actor) -> ih.AreaRangedAttackHandler:
         self.engine.message_log.add_message(
@@ -157,16 +183,15 @@ class FireballDamageConsumable(Consumable):
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You cannot target_class an area that you cannot see.")
 
-        targets_hit = False
+        store = self.engine.game_map.entity_store
+        targets = store.get_entities(store.live_actors_mask() & store.within_radius_mask(*target_xy, self.radius))
 
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    f"The {actor.name} is engulfed in a fiery explosion, taken {self.damage} damage!"
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        for actor in targets:
+            self.engine.message_log.add_message(
+                f"The {actor.name} is engulfed in a fiery explosion, taken {self.damage} damage!"
+            )
+            actor.fighter.take_damage(self.damage)
 
-        if not targets_hit:
+        if not targets:
             raise Impossible("There are no targets in the radius.")
         self.consume()
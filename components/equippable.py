@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from components.base_components import BaseComponent
+from kind import Kind, KindAttribute
 from equipment_types import EquipmentType
 
 if TYPE_CHECKING:
@@ -10,35 +11,47 @@ if TYPE_CHECKING:
 
 
 class Equippable(BaseComponent):
+    __slots__ = ("kind", "overrides")
+
     parent: Item
 
+    equipment_type = KindAttribute()
+    power_bonus = KindAttribute()
+    defense_bonus = KindAttribute()
+
     def __init__(
         self,
         equipment_type: EquipmentType,
         power_bonus: int = 0,
         defense_bonus: int = 0,
     ):
-        self.equipment_type = equipment_type
-
-        self.power_bonus = power_bonus
-        self.defense_bonus = defense_bonus
+        self.kind = Kind(equipment_type=equipment_type, power_bonus=power_bonus, defense_bonus=defense_bonus)
+        self.overrides = None
 
 
 class Dagger(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.WEAPON, power_bonus=2)
 
 
 class Sword(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.WEAPON, power_bonus=4)
 
 
 class LeatherArmor(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.ARMOR, defense_bonus=1)
 
 
 class ChainMail(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.ARMOR, defense_bonus=3)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Tuple, TYPE_CHECKING
 
 from components.base_components import BaseComponent
 from graphics import color
+from kind import Kind, KindAttribute
+from message_log import MessageTemplate
 from render_order import RenderOrder
 
 if TYPE_CHECKING:
@@ -11,13 +13,19 @@ if TYPE_CHECKING:
 
 
 class Fighter(BaseComponent):
+    __slots__ = ("kind", "overrides", "_hp")
+
     parent: Actor
 
+    # Shared through the kind until leveling up changes them
+    max_hp = KindAttribute()
+    base_defense = KindAttribute()
+    base_power = KindAttribute()
+
     def __init__(self, hp: int, base_defense: int, base_power: int):
-        self.max_hp = hp
+        self.kind = Kind(max_hp=hp, base_defense=base_defense, base_power=base_power)
+        self.overrides = None
         self._hp = hp
-        self.base_defense = base_defense
-        self.base_power = base_power
 
     @property
     def hp(self) -> int:
@@ -70,10 +78,12 @@ class Fighter(BaseComponent):
 
     def die(self) -> None:
         if self.engine.player is self.parent:
-            death_message = "You died!"
+            death_message = MessageTemplate.PLAYER_DEATH
+            death_args: Tuple[str, ...] = ()
             death_message_color = color.player_die
         else:
-            death_message = f"{self.parent.name} is dead!"
+            death_message = MessageTemplate.DEATH
+            death_args = (self.parent.name,)
             death_message_color = color.player_die
 
         self.parent.char = "%"
@@ -82,6 +92,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
-        self.engine.message_log.add_message(death_message, death_message_color)
+        self.gamemap.on_actor_death(self.parent)
+        self.engine.message_log.add_template(death_message, death_args, death_message_color)
 
         self.engine.player.level.add_xp(self.parent.level.xp_given)
@@ -3,16 +3,22 @@ from __future__ import annotations
 from typing import List, TYPE_CHECKING
 
 from components.base_components import BaseComponent
+from kind import Kind, KindAttribute
 
 if TYPE_CHECKING:
     from entity import Actor, Item
 
 
 class Inventory(BaseComponent):
+    __slots__ = ("kind", "overrides", "items")
+
     parent: Actor
 
+    capacity = KindAttribute()
+
     def __init__(self, capacity: int):
-        self.capacity = capacity
+        self.kind = Kind(capacity=capacity)
+        self.overrides = None
         self.items: List[Item] = []
 
     def drop(self, item: Item) -> None:
@@ -3,14 +3,22 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from components.base_components import BaseComponent
+from kind import Kind, KindAttribute
+from message_log import MessageTemplate
 
 if TYPE_CHECKING:
     from entity import Actor
 
 
 class Level(BaseComponent):
+    __slots__ = ("kind", "overrides", "current_level", "current_xp")
+
     parent: Actor
 
+    level_up_base = KindAttribute()
+    level_up_factor = KindAttribute()
+    xp_given = KindAttribute()
+
     def __init__(
             self,
             current_level: int = 1,
@@ -19,11 +27,10 @@ class Level(BaseComponent):
             level_up_factor: int = 150,
             xp_given: int = 0,
     ):
+        self.kind = Kind(level_up_base=level_up_base, level_up_factor=level_up_factor, xp_given=xp_given)
+        self.overrides = None
         self.current_level = current_level
         self.current_xp = current_xp
-        self.level_up_base = level_up_base
-        self.level_up_factor = level_up_factor
-        self.xp_given = xp_given
 
     @property
     def experience_to_next_level(self) -> int:
@@ -38,12 +45,10 @@ class Level(BaseComponent):
             return
 
         self.current_xp += xp
-        self.engine.message_log.add_message(f"You gain {xp} experience points.")
+        self.engine.message_log.add_template(MessageTemplate.GAIN_XP, (xp,))
 
         if self.requires_level_up:
-            self.engine.message_log.add_message(
-                f"You advance to level {self.current_level + 1}!"
-            )
+            self.engine.message_log.add_template(MessageTemplate.LEVEL_ADVANCE, (self.current_level + 1,))
 
     def increase_level(self) -> None:
         self.current_level += 1
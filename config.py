@@ -5,3 +5,7 @@ and be something plane text
 """
 
 SAVE_LOCATION = "savegame.sav"
+# Messages too old to stay in memory are written here so the message history can still show them
+HISTORY_LOCATION = "message_history.log"
+# How far the player can see, big enough to reach across any map. Enemies that chase the player see as far
+FOV_RADIUS = 1000
@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import lzma
 import pickle
-from typing import TYPE_CHECKING
+import time
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
 
+import numpy as np
 from tcod.console import Console
 from tcod.map import compute_fov
 
@@ -24,12 +26,14 @@ class Engine:
     :type player: Player
     :param fov: whether the game renders the players field of view
     :type fov: bool
+    :param history_file: file that messages too old to keep in memory are written to, None to drop them
+    :type history_file: str
     """
     game_map: GameMap
     game_world: GameWorld
 
-    def __init__(self, player: Actor, fov: bool = True):
-        self.message_log = MessageLog()
+    def __init__(self, player: Actor, fov: bool = True, history_file: Optional[str] = None):
+        self.message_log = MessageLog(history_file=history_file)
         self.player = player
         self.mouse_location = (0, 0)
         self.hasFov = fov
@@ -38,11 +42,48 @@ class Engine:
         self.enemy_supplies: int = 0
         self.friendly_supplies: int = 0
 
+        # Walking distance to the nearest supplies, shared by every scavenger for the current turn
+        self.supply_distances: Optional[np.ndarray] = None
+
+        # How many times this turn an AI reused its stored path (hit) or had to search for a new one (miss)
+        self.path_cache_hits: int = 0
+        self.path_cache_misses: int = 0
+
+        # What the current field of view was computed from: (game map, player position, radius, tiles version)
+        self.fov_key: Optional[Tuple[GameMap, Tuple[int, int], int, int]] = None
+        self.fov_recomputes: int = 0
+        self.fov_recomputes_avoided: int = 0
+
+        # Frame time counters for render(), in seconds
+        self.frame_count: int = 0
+        self.last_frame_time: float = 0.0
+        self.total_frame_time: float = 0.0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Rebuilt every turn by handle_entity_turns so don't put it in save files
+        state["supply_distances"] = None
+        return state
+
     def handle_entity_turns(self) -> None:
         """
-        Calls the entity.ai.perform() of all entities that have that component minus the player
+        Calls the entity.ai.perform() of the actors whose turn it is, minus the player. The map's scheduler
+        decides who that is based on each actor's speed.
+        The supply distance field is computed once here and shared by every EnemySupplyScavenger, as are the
+        fields of view of the actors that look around and act this turn
         """
-        for entity in set(self.game_map.actors) - {self.player}:
+        self.supply_distances = self.game_map.get_supply_distances()
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+
+        # Work out what every actor with sight can see in one pass, actors sharing a tile share a field of view
+        self.game_map.perception.compute_many(
+            (actor.x, actor.y, actor.ai.sight_radius)
+            for actor in self.game_map.scheduler.peek_due()
+            if actor.ai and actor.ai.sight_radius
+        )
+
+        for entity in self.game_map.scheduler.actors_due():
             if entity.ai:
                 try:
                     entity.ai.perform()
@@ -60,17 +101,28 @@ Note that currently this calls handle_entity_turns and acts on all entities minu
         """
         Recompute the visible area based on the players point of view.
         if hasFov is false then this will not act on anything
+        Nothing is recomputed when the map, the player's position, the radius and the map's tiles are all the same
+        as last time.
         """
         if not self.hasFov:
             return
 
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=sight_radius,
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+        fov_key = (game_map, (x, y), sight_radius, game_map.tiles_version)
+        if fov_key == self.fov_key:
+            self.fov_recomputes_avoided += 1
+            return
+        self.fov_key = fov_key
+        self.fov_recomputes += 1
+
+        game_map.set_visible(
+            compute_fov(
+                game_map.tiles["transparent"],
+                (x, y),
+                radius=sight_radius,
+            )
         )
-        # If a tile is visible it should be added to explored
-        self.game_map.explored |= self.game_map.visible
 
     def render(self, console: Console) -> None:
         """
@@ -81,6 +133,7 @@ Note that currently this calls handle_entity_turns and acts on all entities minu
         :type console: Console (libtcod class)
         :return: None
         """
+        frame_start = time.perf_counter()
         try:
             self.game_map.render(console)
         except ValueError as e:
@@ -111,6 +164,17 @@ Note that currently this calls handle_entity_turns and acts on all entities minu
             console=console, x=21, y=44, engine=self
         )
 
+        self.last_frame_time = time.perf_counter() - frame_start
+        self.frame_count += 1
+        self.total_frame_time += self.last_frame_time
+
+    @property
+    def average_frame_time(self) -> float:
+        """Average time spent in render() per frame, in seconds."""
+        if not self.frame_count:
+            return 0.0
+        return self.total_frame_time / self.frame_count
+
     def save_as(self, filename: str) -> None:
         """Save this Engine instance as a compressed file."""
         save_data = lzma.compress(pickle.dumps(self))
@@ -2,8 +2,12 @@ from __future__ import annotations
 
 import copy
 import math
-from typing import Optional, Tuple, Type, TypeVar, TYPE_CHECKING, Union
+import weakref
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple, Type, TypeVar, TYPE_CHECKING, Union
 
+from components.base_components import BaseComponent
+from kind import Kind, KindAttribute
 from render_order import RenderOrder
 
 if TYPE_CHECKING:
@@ -14,18 +18,141 @@ if TYPE_CHECKING:
     from components.fighter import Fighter
     from components.inventory import Inventory
     from components.level import Level
+    from entity_store import EntityStore
     from game_map import GameMap
 
 T = TypeVar("T", bound="Entity")
 
+# Values of these types never change so copies can share them
+IMMUTABLE_TYPES = (int, float, str, bytes, bool, type(None), Enum, type, Kind)
+# Entity attributes that describe where an entity is rather than what it is, a fresh copy starts without them
+PLACEMENT_ATTRIBUTES = frozenset(("parent", "store", "store_id"))
+
+# How a Prototype fills in each attribute
+SHARE = 0  # The same value, it's immutable
+COPY_LIST = 1  # A new list of the same immutable values
+OWNED = 2  # A copy of an object the entity owns, built from a nested Prototype
+OWNED_LIST = 3  # A new list of owned objects, each a nested Prototype or a reference
+REFERENCE = 4  # The copy of an object built earlier in the same build, such as a component's parent
+DEEP_COPY = 5  # Anything else, copied with copy.deepcopy
+
+
+def get_attributes(obj: Any) -> Dict[str, Any]:
+    """The attributes set on an object, whether they live in its __slots__ or its __dict__."""
+    attributes = {}
+    for cls in reversed(type(obj).__mro__):
+        for name in cls.__dict__.get("__slots__", ()):
+            if name != "__weakref__" and hasattr(obj, name):
+                attributes[name] = getattr(obj, name)
+    attributes.update(getattr(obj, "__dict__", {}))
+    return attributes
+
+
+def is_immutable(value: Any) -> bool:
+    if isinstance(value, tuple):
+        return all(is_immutable(item) for item in value)
+    return isinstance(value, IMMUTABLE_TYPES)
+
+
+class Prototype:
+    """
+    A compiled recipe for copying an entity, used by Entity.clone() and spawn() instead of copy.deepcopy.
+
+    The entity's attributes are looked at once, when the prototype is built. Immutable values are shared by every
+    copy. Components, the AI and items held in an inventory are owned objects and each copy gets fresh ones, with
+    their references back to the entity, or to each other, pointing at the new objects. Lists of immutable values
+    are copied and anything unrecognised falls back to copy.deepcopy.
+
+    The values are the ones the entity had when the prototype was built.
+    """
+
+    def __init__(self, obj: Any, seen: Optional[Set[int]] = None):
+        # Only the entity being cloned starts off the map, items it holds keep their parent
+        self.root_entity = seen is None and isinstance(obj, Entity)
+        skip = PLACEMENT_ATTRIBUTES if self.root_entity else frozenset()
+        if seen is None:
+            seen = set()
+        seen.add(id(obj))
+        self.cls = type(obj)
+        self.source_id = id(obj)
+        self.fields: List[Tuple[str, int, Any]] = []
+
+        for name, value in get_attributes(obj).items():
+            if name in skip:
+                continue
+            if id(value) in seen:
+                self.fields.append((name, REFERENCE, id(value)))
+            elif is_immutable(value):
+                self.fields.append((name, SHARE, value))
+            elif self.is_owned(value, seen):
+                self.fields.append((name, OWNED, Prototype(value, seen)))
+            elif isinstance(value, list) and all(is_immutable(item) for item in value):
+                self.fields.append((name, COPY_LIST, list(value)))
+            elif isinstance(value, list) and all(id(item) in seen or self.is_owned(item, seen) for item in value):
+                items = [
+                    (REFERENCE, id(item)) if id(item) in seen else (OWNED, Prototype(item, seen)) for item in value
+                ]
+                self.fields.append((name, OWNED_LIST, items))
+            else:
+                self.fields.append((name, DEEP_COPY, value))
+
+    @staticmethod
+    def is_owned(value: Any, seen: Set[int]) -> bool:
+        """Entities, components and objects such as an AI that point back at something already being copied."""
+        if isinstance(value, (Entity, BaseComponent)):
+            return True
+        return id(getattr(value, "entity", None)) in seen
+
+    def build(self, memo: Optional[Dict[int, Any]] = None) -> Any:
+        """
+        Make a new copy.
+        :param memo: the copies made so far in this build keyed by the id of what they copy, in the same form as a
+            copy.deepcopy memo
+        """
+        if memo is None:
+            memo = {}
+        obj = self.cls.__new__(self.cls)
+        memo[self.source_id] = obj
+        if self.root_entity:
+            obj.store = None
+            obj.store_id = -1
+
+        for name, how, value in self.fields:
+            if how == SHARE:
+                setattr(obj, name, value)
+            elif how == COPY_LIST:
+                setattr(obj, name, list(value))
+            elif how == OWNED:
+                setattr(obj, name, value.build(memo))
+            elif how == OWNED_LIST:
+                setattr(obj, name, [memo[item] if item_how == REFERENCE else item.build(memo) for item_how, item in value])
+            elif how == REFERENCE:
+                setattr(obj, name, memo[value])
+            else:
+                setattr(obj, name, copy.deepcopy(value, memo))
+        return obj
+
+
+# The compiled Prototype of each entity that has been cloned
+prototypes: weakref.WeakKeyDictionary[Entity, Prototype] = weakref.WeakKeyDictionary()
+
 
 class Entity:
     """
     A generic object to represent players, enemies, items, etc.
+    The char, color and name are shared through the entity's Kind until they are changed on the entity.
     """
 
+    __slots__ = (
+        "store", "store_id", "_x", "_y", "kind", "overrides", "_blocks_movement", "_render_order", "parent", "__weakref__"
+    )
+
     parent: Union[GameMap, Inventory]
 
+    char = KindAttribute()
+    color = KindAttribute()
+    name = KindAttribute()
+
     def __init__(
         self,
         parent: Optional[GameMap] = None,
@@ -37,41 +164,100 @@ class Entity:
         blocks_movement: bool = False,
         render_order: RenderOrder = RenderOrder.CORPSE,
     ):
+        # Set by the GameMap's EntityStore while this entity is on a map
+        self.store: Optional[EntityStore] = None
+        self.store_id = -1
         self.x = x
         self.y = y
-        self.char = char
-        self.color = color
-        self.name = name
-        self.blocks_movement = blocks_movement
-        self.render_order = render_order
+        self.kind = Kind(char=char, color=color, name=name)
+        self.overrides: Optional[Dict[str, Any]] = None  # Values changed on this entity, see KindAttribute
+        self._blocks_movement = blocks_movement
+        self._render_order = render_order
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    @property
+    def x(self) -> int:
+        return self._x
+
+    @x.setter
+    def x(self, value: int) -> None:
+        self._x = value
+        if self.store is not None:
+            self.store.x[self.store_id] = value
+
+    @property
+    def y(self) -> int:
+        return self._y
+
+    @y.setter
+    def y(self, value: int) -> None:
+        self._y = value
+        if self.store is not None:
+            self.store.y[self.store_id] = value
+
+    @property
+    def blocks_movement(self) -> bool:
+        return self._blocks_movement
+
+    @blocks_movement.setter
+    def blocks_movement(self, value: bool) -> None:
+        # The map keeps a path cost grid of blocking entities so let it know about the change
+        if hasattr(self, "parent"):
+            self.gamemap.update_blocks_movement(self, value)
+        self._blocks_movement = value
+
+    @property
+    def render_order(self) -> RenderOrder:
+        return self._render_order
+
+    @render_order.setter
+    def render_order(self, value: RenderOrder) -> None:
+        # The map keeps its entities bucketed by render order for drawing
+        if hasattr(self, "parent"):
+            self.gamemap.update_render_order(self, value)
+        self._render_order = value
+
+    def clone(self: T) -> T:
+        """
+        Return a copy of this entity that isn't on any map.
+        Copies are built from a Prototype compiled the first time the entity is cloned, so this is meant for
+        template entities, such as the ones in entity_factories, that don't change after that.
+        """
+        prototype = prototypes.get(self)
+        if prototype is None:
+            prototype = prototypes[self] = Prototype(self)
+        return prototype.build()
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         """Spawn a copy of this instance at the given location."""
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entitiy at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
+            # The new map may already list this entity (GameMap(entities=...)) so index it again at x, y
+            gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        else:
+            self.gamemap.move_entity(self, x, y)
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -81,8 +267,7 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         # Move the entity by a given amount
-        self.x += dx
-        self.y += dy
+        self.gamemap.move_entity(self, self.x + dx, self.y + dy)
 
 
 class Actor(Entity):
@@ -90,6 +275,9 @@ class Actor(Entity):
     Extension of Entity. Has ai, fighter, inventory, and level so on. These components do not need to be functional
     for all actors (enemies do not need working inventory and so on)
     """
+
+    __slots__ = ("ai", "equipment", "fighter", "inventory", "level", "speed")
+
     def __init__(
         self,
         *,
@@ -103,6 +291,7 @@ class Actor(Entity):
         fighter: Fighter,
         inventory: Inventory,
         level: Level,
+        speed: int = 100,
     ):
         super().__init__(
             x=x,
@@ -128,6 +317,9 @@ class Actor(Entity):
         self.level = level
         self.level.parent = self
 
+        # How often this actor gets a turn. 100 is once per player turn, see TurnScheduler
+        self.speed = speed
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -135,6 +327,8 @@ class Actor(Entity):
 
 
 class Item(Entity):
+    __slots__ = ("consumable", "equippable")
+
     def __init__(
         self,
         *,
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from enum import IntEnum
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from entity import Entity
+
+
+class Faction(IntEnum):
+    NEUTRAL = 0  # Items and anything else that doesn't fight
+    PLAYER = 1
+    ENEMY = 2
+
+
+class EntityStore:
+    """
+    Struct of arrays copy of the entity state that radius, nearest and field of view queries need.
+    Each entity on a GameMap gets a stable id, a row in these arrays, until it is removed from the map.
+    Queries then run as single NumPy operations instead of Python loops over the entities.
+
+    The Entity objects stay the source of truth. Entity.x and Entity.y write through to this store and the GameMap
+    keeps the other columns up to date.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.in_use = np.zeros(capacity, dtype=bool)  # False for ids that are free to hand out
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.faction = np.zeros(capacity, dtype=np.int8)
+        self.blocks_movement = np.zeros(capacity, dtype=bool)
+        self.entities: List[Optional[Entity]] = [None] * capacity
+        self.free_ids: List[int] = []
+        self.size = 0  # Every id in use is below this
+
+    def add(self, entity: Entity, alive: bool, faction: Faction) -> int:
+        """Give an entity a row in the store and attach the store to it. Returns the entity's id."""
+        if self.free_ids:
+            entity_id = self.free_ids.pop()
+        else:
+            if self.size == len(self.entities):
+                self._grow()
+            entity_id = self.size
+            self.size += 1
+
+        self.x[entity_id] = entity.x
+        self.y[entity_id] = entity.y
+        self.in_use[entity_id] = True
+        self.alive[entity_id] = alive
+        self.faction[entity_id] = faction
+        self.blocks_movement[entity_id] = entity.blocks_movement
+        self.entities[entity_id] = entity
+        entity.store = self
+        entity.store_id = entity_id
+        return entity_id
+
+    def remove(self, entity: Entity) -> None:
+        """Free the entity's row and detach the store from it."""
+        entity_id = entity.store_id
+        self.in_use[entity_id] = False
+        self.alive[entity_id] = False
+        self.entities[entity_id] = None
+        self.free_ids.append(entity_id)
+        entity.store = None
+        entity.store_id = -1
+
+    def _grow(self) -> None:
+        """Double the capacity of every column."""
+        capacity = len(self.entities) * 2
+        for name in ("x", "y", "in_use", "alive", "faction", "blocks_movement"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+        self.entities.extend([None] * (capacity - len(self.entities)))
+
+    def get_entities(self, mask: np.ndarray) -> List[Entity]:
+        """Return the entities whose rows are True in a mask from one of the other methods."""
+        return [self.entities[entity_id] for entity_id in np.flatnonzero(mask)]
+
+    def live_actors_mask(self) -> np.ndarray:
+        return self.in_use[: self.size] & self.alive[: self.size]
+
+    def in_fov_mask(self, visible: np.ndarray) -> np.ndarray:
+        """Rows of the entities standing on a True tile of the visible array."""
+        size = self.size
+        return self.in_use[:size] & visible[self.x[:size], self.y[:size]]
+
+    def distances(self, x: int, y: int) -> np.ndarray:
+        """Euclidean distance from x, y to every row, the same measure as Entity.distance()."""
+        return np.hypot(self.x[: self.size] - x, self.y[: self.size] - y)
+
+    def within_radius_mask(self, x: int, y: int, radius: float) -> np.ndarray:
+        return self.in_use[: self.size] & (self.distances(x, y) <= radius)
+
+    def within_area_mask(self, index: Tuple[slice, slice]) -> np.ndarray:
+        """Rows of the entities inside a 2D array index of slices, such as RectangularRoom.inner."""
+        x_slice, y_slice = index
+        x = self.x[: self.size]
+        y = self.y[: self.size]
+        return (
+            self.in_use[: self.size]
+            & (x >= x_slice.start) & (x < x_slice.stop)
+            & (y >= y_slice.start) & (y < y_slice.stop)
+        )
+
+    def nearest(self, x: int, y: int, mask: np.ndarray, max_distance: float) -> Optional[Entity]:
+        """
+        Return the entity in the mask closest to x, y, as long as it is strictly closer than max_distance.
+        """
+        distances = np.where(mask, self.distances(x, y), np.inf)
+        if not len(distances):
+            return None
+        entity_id = int(np.argmin(distances))
+        if distances[entity_id] >= max_distance:
+            return None
+        return self.entities[entity_id]
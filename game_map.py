@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING, Set, Any
+from collections import deque
+from typing import AbstractSet, Collection, Dict, Iterable, Iterator, List, Optional, TYPE_CHECKING, Set, Tuple, Type, Any
 import numpy as np  # type: ignore
+import tcod
 from tcod.console import Console
 
 import components.base_components
 from components.consumable import Consumable, Supplies
 from entity import Actor, Item
+from entity_store import EntityStore, Faction
+from perception import Perception
+from render_order import RenderOrder
 import tile_room_types
+from turn_scheduler import TurnScheduler
 
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
+    from procgen import RectangularRoom
+
+# Added to the path cost of a tile for each entity blocking it.
+# A lower number means more enemies will crowd behind each other in
+# hallways.  A higher number means enemies will take longer paths in
+# order to surround the player.
+BLOCKER_COST = 10
 
 
 class GameMap:
@@ -20,19 +33,64 @@ class GameMap:
     self.tiles
     self.visible
     self.explored
+    self.path_cost - pathfinding cost grid kept up to date as entities and tiles change
+    self.rooms - the rooms procgen carved, with self.room_links recording which rooms a tunnel joins
+    self.scheduler - turn order of the living actors other than the player
+    self.entity_locations - spatial index of which entities stand on each (x, y)
+    self.live_actors, self.item_entities, self.consumables_by_class - entities by type, kept up to date so that
+        the actors, items and consumable_items properties don't have to check every entity
+    self.entity_store - positions and flags of every entity in NumPy arrays for vectorised queries
+    self.render_layers - the entities in each RenderOrder, drawn in that order
+    self.perception - cached fields of view for the AI's own sight
+
+    Changes to visible should go through set_visible() so the render cache knows to redraw those tiles.
+
+    Entities should be added, removed and moved through add_entity(), remove_entity() and move_entity(), and tiles
+    written through set_tiles(), so that the path cost grid never has to be rebuilt.
     """
 
+    # When True every get_path_cost() call compares the maintained grid against a full rebuild.
+    # Slow, only meant for tests and debugging.
+    check_path_cost: bool = False
+
     def __init__(
             self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        self.entities: Set[Entity] = set()
+        # Only tiles with something on them have an entry
+        self.entity_locations: Dict[Tuple[int, int], Set[Entity]] = {}
+        self.live_actors: Set[Actor] = set()
+        self.item_entities: Set[Item] = set()
+        self.consumables_by_class: Dict[Type[Consumable], Set[Item]] = {}
+        self.entity_store = EntityStore()
+        self.render_layers: Dict[RenderOrder, Set[Entity]] = {render_order: set() for render_order in RenderOrder}
         self.tiles = np.full((width, height), fill_value=tile_room_types.wall, order="F")
 
+        # Number of movement blocking entities on each tile and the resulting cost to path through it.
+        # A cost of 0 is impassable. Both are left out of save files and rebuilt when first used after loading.
+        self._blockers: Optional[np.ndarray] = np.zeros((width, height), dtype=np.int16, order="F")
+        self._path_cost: Optional[np.ndarray] = np.zeros((width, height), dtype=np.int16, order="F")
+        # Bumped whenever tiles change so cached paths know when they may be out of date
+        self.tiles_version = 0
+        self.perception = Perception(self)
+
+        # Room connectivity graph from procgen. room_links[i] holds the indexes of rooms tunnelled to rooms[i] and
+        # room_index holds the room each tile belongs to, or -1 outside of rooms
+        self.rooms: List[RectangularRoom] = []
+        self.room_links: List[Set[int]] = []
+        self.room_index = np.full((width, height), fill_value=-1, dtype=np.int16, order="F")
+
+        self.scheduler = TurnScheduler()
+        for entity in entities:
+            self.add_entity(entity)
+
         self.visible = np.full(
             (width, height), fill_value=False, order="F"
         )  # Tiles the player can currently see
+        # Box around the visible tiles as x1, y1, x2, y2 (exclusive), None while nothing is visible
+        self.visible_bounds: Optional[Tuple[int, int, int, int]] = None
         self.explored = np.full(
             (width, height), fill_value=False, order="F"
         )  # Tiles the player has seen & is different from never seen
@@ -45,22 +103,258 @@ class GameMap:
 
         self.downstairs_location = (0, 0)
 
+        # The last composited light/dark/SHROUD tiles and the area of them that is out of date, as
+        # (x1, y1, x2, y2) with exclusive ends. None when the cache is current
+        self.rendered_tiles = np.full((width, height), fill_value=tile_room_types.SHROUD, order="F")
+        self.render_dirty: Optional[Tuple[int, int, int, int]] = (0, 0, width, height)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # The composited tiles are only a render cache so don't put them in save files
+        del state["rendered_tiles"]
+        # The path cost grids can be rebuilt from the tiles and entities
+        state["_blockers"] = state["_path_cost"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Saves from before visible_bounds existed don't have it
+        self.visible_bounds = self.get_bounds(self.visible)
+        self.rendered_tiles = np.full((self.width, self.height), fill_value=tile_room_types.SHROUD, order="F")
+        self.render_dirty = (0, 0, self.width, self.height)
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map. Does not change the entity's parent."""
+        if entity in self.entities:
+            return
+        # Before the entity joins self.entities, in case this is the first use of the grids after loading
+        if entity.blocks_movement:
+            self._add_blocker(entity.x, entity.y, 1)
+        self.entities.add(entity)
+        self._index_location(entity)
+        self.entity_store.add(entity, alive=isinstance(entity, Actor) and entity.is_alive, faction=self._faction(entity))
+        self.render_layers[entity.render_order].add(entity)
+
+        if isinstance(entity, Actor) and entity.is_alive:
+            self.live_actors.add(entity)
+            if entity is not self.engine.player:
+                self.scheduler.add(entity)
+        elif isinstance(entity, Item):
+            self.item_entities.add(entity)
+            if entity.consumable is not None:
+                self.consumables_by_class.setdefault(type(entity.consumable), set()).add(entity)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map. Does nothing if the entity isn't here."""
+        if entity not in self.entities:
+            return
+        # While the entity is still in self.entities, in case this is the first use of the grids after loading
+        if entity.blocks_movement:
+            self._add_blocker(entity.x, entity.y, -1)
+        self.entities.remove(entity)
+        self._unindex_location(entity)
+        self.entity_store.remove(entity)
+        self.render_layers[entity.render_order].remove(entity)
+
+        self.live_actors.discard(entity)
+        self.scheduler.unschedule(entity)
+        if isinstance(entity, Item):
+            self.item_entities.discard(entity)
+            if entity.consumable is not None:
+                self.consumables_by_class[type(entity.consumable)].discard(entity)
+
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Change an entity's position, keeping the location index and path cost grid in sync."""
+        if entity not in self.entities:
+            entity.x = x
+            entity.y = y
+            return
+
+        self._unindex_location(entity)
+        if entity.blocks_movement:
+            self._add_blocker(entity.x, entity.y, -1)
+            self._add_blocker(x, y, 1)
+        entity.x = x
+        entity.y = y
+        self._index_location(entity)
+
+    def _index_location(self, entity: Entity) -> None:
+        self.entity_locations.setdefault((entity.x, entity.y), set()).add(entity)
+
+    def _unindex_location(self, entity: Entity) -> None:
+        location = entity.x, entity.y
+        here = self.entity_locations[location]
+        here.remove(entity)
+        if not here:
+            del self.entity_locations[location]
+
+    def on_actor_death(self, actor: Actor) -> None:
+        """Called by Fighter.die once the actor has lost its ai."""
+        self.live_actors.discard(actor)
+        self.scheduler.unschedule(actor)
+        if actor.store is self.entity_store:
+            self.entity_store.alive[actor.store_id] = False
+
+    def _faction(self, entity: Entity) -> Faction:
+        if entity is self.engine.player:
+            return Faction.PLAYER
+        if isinstance(entity, Actor):
+            return Faction.ENEMY
+        return Faction.NEUTRAL
+
+    def update_blocks_movement(self, entity: Entity, blocks_movement: bool) -> None:
+        """Called by the entity just before its blocks_movement flag changes."""
+        if entity.blocks_movement != blocks_movement and entity in self.entities:
+            self._add_blocker(entity.x, entity.y, 1 if blocks_movement else -1)
+            self.entity_store.blocks_movement[entity.store_id] = blocks_movement
+
+    def update_render_order(self, entity: Entity, render_order: RenderOrder) -> None:
+        """Called by the entity just before its render_order changes."""
+        if entity in self.entities:
+            self.render_layers[entity.render_order].remove(entity)
+            self.render_layers[render_order].add(entity)
+
+    def _add_blocker(self, x: int, y: int, amount: int) -> None:
+        """Add (or with a negative amount remove) blocking entities from a tile."""
+        self.blockers[x, y] += amount
+        if self.tiles["walkable"][x, y]:
+            self.path_cost[x, y] += BLOCKER_COST * amount
+
+    def set_tiles(self, index: Any, tile: np.ndarray) -> None:
+        """
+        Write tiles into the map. All tile changes should go through here so the path cost grid stays correct.
+        :param index: any numpy index into tiles, such as an (x, y) tuple, a pair of slices or a boolean mask
+        :param tile: the tile type to write, for example tile_room_types.floor
+        """
+        self.tiles[index] = tile
+        self.tiles_version += 1
+        self.mark_dirty(*self._index_bounds(index))
+        self.path_cost[index] = self.tiles["walkable"][index] * (1 + BLOCKER_COST * self.blockers[index])
+
+    def _index_bounds(self, index: Any) -> Tuple[int, int, int, int]:
+        """Bounding box of a set_tiles() index. Anything other than ints and slices covers the whole map."""
+        if isinstance(index, tuple) and len(index) == 2:
+            bounds = []
+            for axis, size in zip(index, (self.width, self.height)):
+                if isinstance(axis, slice):
+                    axis_range = range(size)[axis]
+                    if axis_range.step != 1:
+                        break
+                    bounds.append((axis_range.start, axis_range.stop))
+                elif isinstance(axis, (int, np.integer)):
+                    bounds.append((int(axis), int(axis) + 1))
+                else:
+                    break
+            else:
+                (x1, x2), (y1, y2) = bounds
+                return x1, y1, x2, y2
+        return 0, 0, self.width, self.height
+
+    @property
+    def blockers(self) -> np.ndarray:
+        if self._blockers is None:
+            self.rebuild_path_cost()
+        return self._blockers
+
+    @property
+    def path_cost(self) -> np.ndarray:
+        if self._path_cost is None:
+            self.rebuild_path_cost()
+        return self._path_cost
+
+    def rebuild_path_cost(self) -> None:
+        """
+        Fill in blockers and path_cost from scratch, after loading.
+        Not done in __setstate__ because while a save is loading the entities may not have their positions yet.
+        """
+        self._blockers = np.zeros((self.width, self.height), dtype=np.int16, order="F")
+        for entity in self.entities:
+            if entity.blocks_movement:
+                self._blockers[entity.x, entity.y] += 1
+        self._path_cost = self.build_path_cost()
+
+    def build_path_cost(self) -> np.ndarray:
+        """Build the path cost grid from scratch. This is what path_cost is maintained to be equal to."""
+        cost = np.array(self.tiles["walkable"], dtype=np.int16, order="F")
+        for entity in self.entities:
+            # Check that an entity blocks movement and the cost isn't zero (blocking.)
+            if entity.blocks_movement and cost[entity.x, entity.y]:
+                cost[entity.x, entity.y] += BLOCKER_COST
+        return cost
+
+    def verify_path_cost(self) -> None:
+        """
+        Compare the maintained path cost grid against a full rebuild.
+        :raises AssertionError: if any tile differs
+        """
+        expected = self.build_path_cost()
+        mismatched = np.argwhere(expected != self.path_cost)
+        assert not len(mismatched), f"path_cost is out of date at {mismatched[:10].tolist()}"
+
+    def get_path_cost(self) -> np.ndarray:
+        """
+        Return the path cost grid for pathfinding. This is the maintained array itself so do not modify it.
+        If check_path_cost is set it is verified first.
+        """
+        if self.check_path_cost:
+            self.verify_path_cost()
+        return self.path_cost
+
+    def add_room(self, room: RectangularRoom) -> int:
+        """
+        Record a room for the room graph. The room's walls count as part of the room.
+        :return: the index of the room in self.rooms
+        """
+        room_id = len(self.rooms)
+        self.rooms.append(room)
+        self.room_links.append(set())
+        self.room_index[room.x1: room.x2 + 1, room.y1: room.y2 + 1] = room_id
+        return room_id
+
+    def connect_rooms(self, room_a: int, room_b: int) -> None:
+        """Record that a tunnel joins two rooms."""
+        if room_a == room_b:
+            return
+        self.room_links[room_a].add(room_b)
+        self.room_links[room_b].add(room_a)
+
+    def get_room_at(self, x: int, y: int) -> int:
+        """Return the index of the room containing x, y or -1 if it is not inside a recorded room."""
+        return int(self.room_index[x, y])
+
+    def get_room_route(self, start_room: int, goal_room: int) -> List[int]:
+        """
+        Breadth first search over the room graph.
+        :return: room indexes from start_room to goal_room inclusive, or an empty list if they aren't connected
+        """
+        came_from: Dict[int, int] = {start_room: start_room}
+        frontier = deque([start_room])
+        while frontier:
+            room = frontier.popleft()
+            if room == goal_room:
+                route = [room]
+                while room != start_room:
+                    room = came_from[room]
+                    route.append(room)
+                return route[::-1]
+            for neighbour in self.room_links[room]:
+                if neighbour not in came_from:
+                    came_from[neighbour] = room
+                    frontier.append(neighbour)
+        return []
+
     @property
     def actors(self) -> Iterator[Actor]:
-        """Iterate over this mapping living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        """Iterate over this mapping living actors. Safe to use when actors die during the loop."""
+        yield from tuple(self.live_actors)
 
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        yield from tuple(self.item_entities)
 
     @property
     def consumable_items(self) -> Iterator[Item]:
@@ -68,7 +362,21 @@ class GameMap:
         Return items with the consumable object attached
         :return:
         """
-        yield from (item for item in self.items if item.consumable is not None)
+        for items in tuple(self.consumables_by_class.values()):
+            yield from tuple(items)
+
+    def get_consumables(self, target_class: Type[Consumable]) -> Iterator[Item]:
+        """Iterate over the items whose consumable is an instance of target_class."""
+        for consumable_class, items in tuple(self.consumables_by_class.items()):
+            if issubclass(consumable_class, target_class):
+                yield from tuple(items)
+
+    def get_entities_at_location(self, x: int, y: int) -> AbstractSet[Entity]:
+        """
+        Return every entity at the location using the location index. Do not modify the returned set, copy it first
+        if entities are going to be added or removed while looping over it.
+        """
+        return self.entity_locations.get((x, y), frozenset())
 
     def get_blocking_entity_at_location(
             self, location_x: int, location_y: int
@@ -80,12 +388,8 @@ class GameMap:
         :param location_y:
         :return: None or a single entity at the location given
         """
-        for entity in self.entities:
-            if (
-                    entity.blocks_movement
-                    and entity.x == location_x
-                    and entity.y == location_y
-            ):
+        for entity in self.get_entities_at_location(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
 
         return None
@@ -93,27 +397,24 @@ class GameMap:
     def get_blocking_entity_at_location_set(
             self, location_x: int, location_y: int
     ) -> Set:
-        e_set = set()
-        for entity in self.entities:
-            if (
-                    entity.blocks_movement
-                    and entity.x == location_x
-                    and entity.y == location_y
-            ):
-                e_set.add(entity)
-
-        return e_set
+        return {
+            entity for entity in self.get_entities_at_location(location_x, location_y) if entity.blocks_movement
+        }
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
         """
         Returns the first actor at the location. Note if there are multiple actors here the one returned is unreliable
         :return: An actor entity. Could be a player or enemy
         """
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
 
+    def get_items_at_location(self, x: int, y: int) -> List[Item]:
+        """Return the items at the location."""
+        return [entity for entity in self.get_entities_at_location(x, y) if isinstance(entity, Item)]
+
     @staticmethod
     def get_distance(entity1: Entity, entity2: Entity) -> int:
         """
@@ -143,21 +444,95 @@ class GameMap:
         minimum_dist = -1
         minimum_obj = None
 
-        for item in self.consumable_items:
-            if isinstance(item.consumable, target_class):
-                # This is not running
-                dist = self.get_distance(entity1=source, entity2=item)
-                if dist <= minimum_dist or minimum_dist < 0:
-                    # new contender for closest consumable
-                    minimum_obj = item
-                    minimum_dist = dist
+        for item in self.get_consumables(target_class):
+            dist = self.get_distance(entity1=source, entity2=item)
+            if dist <= minimum_dist or minimum_dist < 0:
+                # new contender for closest consumable
+                minimum_obj = item
+                minimum_dist = dist
 
         return minimum_obj
 
+    def get_consumable_at_location(
+            self, x: int, y: int, target_class: type[Consumable]
+    ) -> Optional[Item]:
+        """
+        Returns the first item at the location whose consumable matches the target_class.
+        :return: An item entity or None if nothing matching is here
+        """
+        for item in self.get_items_at_location(x, y):
+            if isinstance(item.consumable, target_class):
+                return item
+        return None
+
+    def get_supply_distances(self) -> np.ndarray:
+        """
+        Build a walking distance field rooted at every Supplies item on the map (a multi-source Dijkstra map).
+        Uses the same cardinal=2, diagonal=3 costs as BaseAI.get_path_to so "closest" means closest by walking.
+        Tiles that cannot reach any supplies keep the maximum value of the array.
+        :return: int32 array of shape (width, height)
+        """
+        distance = tcod.path.maxarray((self.width, self.height), dtype=np.int32, order="F")
+        for item in self.get_consumables(Supplies):
+            distance[item.x, item.y] = 0
+
+        tcod.path.dijkstra2d(distance, self.tiles["walkable"], 2, 3, out=distance)
+        return distance
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def mark_dirty(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Mark an area (exclusive ends) of the composited tiles as needing to be redrawn."""
+        if self.render_dirty is not None:
+            dirty_x1, dirty_y1, dirty_x2, dirty_y2 = self.render_dirty
+            x1, y1 = min(x1, dirty_x1), min(y1, dirty_y1)
+            x2, y2 = max(x2, dirty_x2), max(y2, dirty_y2)
+        if x1 < x2 and y1 < y2:
+            self.render_dirty = x1, y1, x2, y2
+
+    def set_visible(self, visible: np.ndarray) -> None:
+        """
+        Replace the visible tiles, add them to explored, and mark the tiles that changed for redrawing.
+        Only the bounding boxes of the old and the new visible tiles are compared and copied.
+        """
+        bounds = self.get_bounds(visible)
+        area_bounds = bounds
+        if self.visible_bounds is not None:
+            area_bounds = self.visible_bounds if bounds is None else (
+                min(bounds[0], self.visible_bounds[0]),
+                min(bounds[1], self.visible_bounds[1]),
+                max(bounds[2], self.visible_bounds[2]),
+                max(bounds[3], self.visible_bounds[3]),
+            )
+        if area_bounds is None:
+            return  # Nothing was or is visible
+        x1, y1, x2, y2 = area_bounds
+        area = slice(x1, x2), slice(y1, y2)
+        if np.array_equal(visible[area], self.visible[area]):
+            return
+        # Every changed tile is inside one of the two boxes
+        self.mark_dirty(x1, y1, x2, y2)
+
+        self.visible[area] = visible[area]
+        self.visible_bounds = bounds
+        # If a tile is visible it should be added to explored
+        if bounds is not None:
+            x1, y1, x2, y2 = bounds
+            area = slice(x1, x2), slice(y1, y2)
+            self.explored[area] |= visible[area]
+
+    @staticmethod
+    def get_bounds(mask: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """The x1, y1, x2, y2 (exclusive) box around the True tiles of a mask, or None if there are none."""
+        mask_x = np.flatnonzero(mask.any(axis=1))
+        if not len(mask_x):
+            return None
+        x1, x2 = int(mask_x[0]), int(mask_x[-1]) + 1
+        mask_y = np.flatnonzero(mask[x1:x2].any(axis=0))
+        return x1, int(mask_y[0]), x2, int(mask_y[-1]) + 1
+
     def render(self, console: Console) -> None:
         """
         Renders the map.
@@ -165,20 +540,42 @@ class GameMap:
         If a tile is in the "visible" array, then draw it with the light colors.
         If it isn't, but it's in the explored array then use dark colors.
         Otherwise, the default is SHROUD
+
+        The composited tiles are cached and only the area marked dirty is worked out again.
+        """
+        if self.render_dirty is not None:
+            x1, y1, x2, y2 = self.render_dirty
+            area = slice(x1, x2), slice(y1, y2)
+            self.rendered_tiles[area] = np.select(
+                condlist=[self.visible[area], self.explored[area]],
+                choicelist=[self.tiles["light"][area], self.tiles["dark"][area]],
+                default=tile_room_types.SHROUD,
+            )
+            self.render_dirty = None
+
+        console.tiles_rgb[0: self.width, 0: self.height] = self.rendered_tiles
+
+        # Each layer is drawn over the one before it
+        for render_order in RenderOrder:
+            self.render_entities(console, self.render_layers[render_order])
+
+    def render_entities(self, console: Console, entities: Collection[Entity]) -> None:
+        """
+        Draw a layer of entities straight into the console's glyph and foreground arrays.
+        Only entities on visible tiles are drawn. Entities sharing a tile in the same layer overwrite each other.
         """
-        console.tiles_rgb[0: self.width, 0: self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_room_types.SHROUD,
-        )
-
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
-
-        for entity in entities_sorted_for_rendering:
-            # Only print entities that are in the FOV
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                )
+        if not entities:
+            return
+        count = len(entities)
+        x = np.fromiter((entity.x for entity in entities), dtype=np.intp, count=count)
+        y = np.fromiter((entity.y for entity in entities), dtype=np.intp, count=count)
+
+        # Only print entities that are in the FOV
+        in_fov = self.visible[x, y]
+        if not in_fov.any():
+            return
+        x, y = x[in_fov], y[in_fov]
+        shown = [entity for entity, seen in zip(entities, in_fov) if seen]
+
+        console.ch[x, y] = np.fromiter((ord(entity.char) for entity in shown), dtype=np.int32, count=len(shown))
+        console.fg[x, y] = np.array([entity.color for entity in shown], dtype=np.uint8)
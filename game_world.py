@@ -1,10 +1,53 @@
+from __future__ import annotations
+
+import multiprocessing
+import random
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+import entity_factories
 from engine import Engine
 from procgen import generate_dungeon
 
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+# One worker process, shared by every GameWorld, that generates the next floor while the current one is played.
+# Created the first time a floor is pregenerated. It is started with spawn rather than fork, forking a process that
+# already has the tcod/SDL context and its threads open can deadlock.
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def generate_floor_in_worker(settings: Dict[str, int], floor: int, seed: int) -> GameMap:
+    """
+    Run in the worker process. Build a throwaway engine and world with the same settings and generate the floor.
+    The map comes back holding a stand in player, GameWorld.adopt_floor() swaps the real one in.
+    :param settings: the keyword arguments the GameWorld was made with
+    :param floor: the floor number to generate
+    :param seed: seed for the worker's random module, drawn from the game's so runs stay repeatable
+    """
+    random.seed(seed)
+    engine = Engine(player=entity_factories.player.clone())
+    engine.game_world = GameWorld(engine=engine, current_floor=floor, **settings)
+    return engine.game_world.build_floor()
+
 
 class GameWorld:
     """
     Holds the settings for the GameMap, and generates new maps when moving down the stairs.
+
+    With pregenerate set the next floor is generated in a worker process while the current one is played, so
+    taking the stairs only has to hand the finished map over. If the worker hasn't started on it yet the floor is
+    generated on the spot instead.
     """
 
     def __init__(
@@ -16,7 +59,8 @@ class GameWorld:
             max_rooms: int,
             room_min_size: int,
             room_max_size: int,
-            current_floor: int = 0
+            current_floor: int = 0,
+            pregenerate: bool = False,
     ):
         self.engine = engine
 
@@ -30,15 +74,35 @@ class GameWorld:
 
         self.current_floor = current_floor
 
-    def generate_floor(self) -> None:
-        """
-        Generate a new dungeon and assign it to the current game map,
-        this will overwrite the old dungeon immediately
-        :return: None, as the output is already assigned to the engine's game map
-        """
-        self.current_floor += 1
+        self.pregenerate = pregenerate
+        # The worker's job for the floor after this one
+        self.next_floor: Optional[Future] = None
+
+        # How long the last generate_floor() call took, in seconds, and how the floors so far were made
+        self.last_descent_time: float = 0.0
+        self.pregenerated_floors: int = 0
+        self.synchronous_floors: int = 0
 
-        self.engine.game_map = generate_dungeon(
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # A job in another process can't be saved. After loading, the next descent generates its floor on the spot
+        state["next_floor"] = None
+        return state
+
+    @property
+    def settings(self) -> Dict[str, int]:
+        """The keyword arguments a worker needs to make a GameWorld like this one."""
+        return {
+            "map_width": self.map_width,
+            "map_height": self.map_height,
+            "max_rooms": self.max_rooms,
+            "room_min_size": self.room_min_size,
+            "room_max_size": self.room_max_size,
+        }
+
+    def build_floor(self) -> GameMap:
+        """Generate the dungeon for current_floor."""
+        return generate_dungeon(
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
@@ -48,3 +112,56 @@ class GameWorld:
             friendly_spawn_rooms=3,
             enemy_spawn_rooms=3,
         )
+
+    def start_next_floor(self) -> None:
+        """Start generating the floor after the current one in the worker process."""
+        self.next_floor = get_executor().submit(
+            generate_floor_in_worker, self.settings, self.current_floor + 1, random.getrandbits(64)
+        )
+
+    def take_next_floor(self) -> Optional[GameMap]:
+        """
+        Return the pregenerated map for current_floor, or None if there is none.
+        A job the worker hasn't started is cancelled and None returned. One it is part way through can't be cancelled
+        and would hold up the job for the next floor, so it is waited for, which takes no longer than generating
+        the floor here would.
+        """
+        next_floor, self.next_floor = self.next_floor, None
+        if next_floor is None:
+            return None
+        if next_floor.cancel():
+            return None
+        try:
+            return self.adopt_floor(next_floor.result())
+        except Exception:
+            traceback.print_exc()  # Print to stderr, then generate the floor here instead
+            return None
+
+    def adopt_floor(self, game_map: GameMap) -> GameMap:
+        """Point a map built by the worker at this engine and put the real player where the stand in is."""
+        stand_in = game_map.engine.player
+        game_map.engine = self.engine
+        game_map.remove_entity(stand_in)
+        self.engine.player.place(stand_in.x, stand_in.y, game_map)
+        return game_map
+
+    def generate_floor(self) -> None:
+        """
+        Generate a new dungeon and assign it to the current game map,
+        this will overwrite the old dungeon immediately
+        :return: None, as the output is already assigned to the engine's game map
+        """
+        began = time.perf_counter()
+        self.current_floor += 1
+
+        game_map = self.take_next_floor()
+        if game_map is None:
+            game_map = self.build_floor()
+            self.synchronous_floors += 1
+        else:
+            self.pregenerated_floors += 1
+        self.engine.game_map = game_map
+
+        self.last_descent_time = time.perf_counter() - began
+        if self.pregenerate:
+            self.start_next_floor()
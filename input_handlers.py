@@ -8,6 +8,7 @@ import tcod
 import actions
 import exceptions
 import input.key_actions as key_actions
+from config import FOV_RADIUS
 from actions import (
     Action,
     PickupAction,
@@ -91,7 +92,7 @@ class EventHandler(BaseEventHandler):
 
         self.engine.handle_enemy_turns()
 
-        self.engine.update_fov(1000)
+        self.engine.update_fov(FOV_RADIUS)
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
@@ -539,7 +540,8 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        self.history = engine.message_log.history()
+        self.log_length = len(self.history)
         self.cursor = self.log_length - 1
 
     def on_render(self, console: tcod.Console) -> None:
@@ -560,7 +562,8 @@ class HistoryViewer(EventHandler):
             1,
             log_console.width - 2,
             log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            self.history,
+            end=self.cursor + 1,
         )
         log_console.blit(console, 3, 3)
 
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+
+class Kind:
+    """
+    The shared, immutable part of the entities or components made from one template: an orc's char, color and
+    name, or a Fighter's base stats. Every copy of the template references the same Kind instead of holding its
+    own copy of those values, which keeps each instance small and save files smaller.
+
+    Attributes declared with KindAttribute are read from the Kind until the instance writes them. A write stores
+    the new value on the instance only, copy-on-write, so the Kind itself never changes.
+    """
+
+    def __init__(self, **values: Any):
+        self.__dict__.update(values)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("A Kind is shared between instances and can't be changed")
+
+    def __repr__(self) -> str:
+        return f"Kind({', '.join(f'{name}={value!r}' for name, value in self.__dict__.items())})"
+
+    # Immutable, so copies can share it
+    def __copy__(self) -> Kind:
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Kind:
+        return self
+
+
+class KindAttribute:
+    """
+    An attribute read from the instance's kind unless the instance has written its own value.
+    The owning class must set self.kind, and self.overrides to None, before the attribute is read.
+    Written values go in the instance's overrides dict, which stays None until the first write.
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+        overrides = instance.overrides
+        if overrides is not None and self.name in overrides:
+            return overrides[self.name]
+        try:
+            return instance.kind.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        if instance.overrides is None:
+            instance.overrides = {}
+        instance.overrides[self.name] = value
@@ -1,4 +1,5 @@
 #! /usr/bin/env python3
+import multiprocessing
 import traceback
 
 import tcod
@@ -77,6 +78,8 @@ def main(
 
 
 if __name__ == "__main__":
+    # The next floor is generated in a worker process, which needs this when frozen into an executable
+    multiprocessing.freeze_support()
     # If this is to small for what we try to draw then we have a confusing error
     width = 80
     height = 50
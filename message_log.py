@@ -1,10 +1,41 @@
-from typing import List, Reversible, Tuple, Iterable
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Iterable, Union
+import json
+import os
 import textwrap
+import uuid
 
 import tcod
 
 from graphics import color
 
+# Messages kept in memory. Older ones are written to the history file, if the log has one, or dropped
+MESSAGE_LOG_CAPACITY = 500
+# Every this many records the byte offset of the next one in the history file is remembered
+HISTORY_INDEX_STRIDE = 64
+# Blocks of HISTORY_INDEX_STRIDE records read back from the history file that are kept in memory
+HISTORY_CACHED_BLOCKS = 8
+
+# Every color in graphics.color. Messages in one of these colors store its index instead of the tuple
+PALETTE: Tuple[Tuple[int, int, int], ...] = tuple(
+    dict.fromkeys(value for value in vars(color).values() if isinstance(value, tuple))
+)
+PALETTE_INDEX: Dict[Tuple[int, int, int], int] = {fg: index for index, fg in enumerate(PALETTE)}
+
+
+class MessageTemplate(Enum):
+    """
+    Messages that are logged often, mostly in combat. A templated Message keeps the template and its arguments and
+    only formats the text when it is first shown, so logging one does not build a new string.
+    """
+    ATTACK = "{} attacks {} for {} hit points."
+    ATTACK_NO_DAMAGE = "{} attacks {} but does no damage."
+    PLAYER_DEATH = "You died!"
+    DEATH = "{} is dead!"
+    GAIN_XP = "You gain {} experience points."
+    LEVEL_ADVANCE = "You advance to level {}!"
+
 
 class Message:
     """
@@ -12,15 +43,54 @@ class Message:
     A message will be displayed like: "Your attack misses x3"
     """
 
-    def __init__(self, text: str, fg: Tuple[int, int, int]):
+    def __init__(
+            self, text: Union[str, MessageTemplate], fg: Tuple[int, int, int], args: Tuple[Union[str, int], ...] = (),
+    ):
         """
 
-        :param text: Text to display in the message, no formatting is done to this
+        :param text: Text to display in the message, no formatting is done to this. Or a MessageTemplate
         :param fg: foreground color represented as 3 ints for red, green, blue
+        :param args: the arguments to format a MessageTemplate with
         """
-        self.plain_text = text
-        self.fg = fg
-        self.count = 1
+        self.text = text
+        self.args = args
+        # Index into PALETTE, or the color itself when it is not in the palette
+        self.color: Union[int, Tuple[int, int, int]] = PALETTE_INDEX.get(fg, fg)
+        self._count = 1
+        # Wrapped lines of full_text keyed by width. Cleared when the count, and so the text, changes
+        self.wrapped_lines: Dict[int, List[str]] = {}
+
+    def __getstate__(self) -> dict:
+        # The wrapped lines are cheap to rebuild so leave them out of save files
+        state = self.__dict__.copy()
+        state["wrapped_lines"] = {}
+        return state
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @count.setter
+    def count(self, value: int) -> None:
+        self._count = value
+        self.wrapped_lines.clear()
+
+    @property
+    def plain_text(self) -> str:
+        """The text of this message without the count."""
+        if isinstance(self.text, MessageTemplate):
+            return self.text.value.format(*self.args)
+        return self.text
+
+    @property
+    def fg(self) -> Tuple[int, int, int]:
+        if isinstance(self.color, int):
+            return PALETTE[self.color]
+        return self.color
+
+    def stacks_with(self, text: Union[str, MessageTemplate], args: Tuple[Union[str, int], ...]) -> bool:
+        """Whether a new message of this text and arguments is the same as this one."""
+        return self.text == text and self.args == args
 
     @property
     def full_text(self) -> str:
@@ -29,14 +99,72 @@ class Message:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrap(self, width: int) -> List[str]:
+        """Return the lines of full_text wrapped to width, wrapping it only the first time a width is asked for."""
+        lines = self.wrapped_lines.get(width)
+        if lines is None:
+            lines = self.wrapped_lines[width] = list(MessageLog.wrap(self.full_text, width))
+        return lines
+
 
 class MessageLog:
     """
-    Message log functionality. Stores the list of previous messages and has the render logic for displaying
-    the log
+    Message log functionality. Stores the previous messages and has the render logic for displaying
+    the log.
+
+    Only the newest 'capacity' messages are kept in memory, so memory use and save size stay flat however long
+    the game runs. When a 'history_file' is given the messages pushed out are appended to it, one JSON record per
+    line, and can be read back through history(). Starting a log truncates the file.
     """
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
+    def __init__(self, capacity: int = MESSAGE_LOG_CAPACITY, history_file: Optional[str] = None) -> None:
+        self.messages: Deque[Message] = deque(maxlen=capacity)
+        self.history_file = history_file
+        self.history_count = 0  # Messages written to the history file
+        self.history_size = 0  # Bytes written to the history file
+        # Byte offset of record i * HISTORY_INDEX_STRIDE in the history file
+        self.history_offsets: List[int] = []
+        self.history_blocks: Dict[int, List[Message]] = {}
+
+        if history_file is not None:
+            # The first line ties the file to this log, so a save never reads another game's history
+            self.history_id = uuid.uuid4().hex
+            header = f"{self.history_id}\n".encode()
+            with open(history_file, "wb") as f:
+                f.write(header)
+            self.history_size = len(header)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["history_blocks"] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self.history_file is not None and not self.restore_history_file():
+            # The history file was deleted or reused by a newer game, so the spilled messages are gone
+            self.history_file = None
+            self.history_count = 0
+            self.history_offsets = []
+
+    def restore_history_file(self) -> bool:
+        """
+        Check the history file still belongs to this log and cut it back to the size it had when the log was saved.
+        Records written after the save, by a game that quit without saving or was killed, are dropped so new ones
+        are appended where history_offsets expect them. Returns False if the file can't be used.
+        """
+        try:
+            with open(self.history_file, "rb") as f:
+                header = f.readline()
+            if header != f"{self.history_id}\n".encode() or os.path.getsize(self.history_file) < self.history_size:
+                return False
+            os.truncate(self.history_file, self.history_size)
+            return True
+        except OSError:
+            return False
+
+    def __len__(self) -> int:
+        """Number of messages in the log, including the ones in the history file."""
+        return self.history_count + len(self.messages)
 
     def add_message(
             self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True,
@@ -46,10 +174,72 @@ class MessageLog:
         If 'stack' is True then the message can stack with a previous message
         of the same text.
         """
-        if stack and self.messages and text == self.messages[-1].plain_text:
+        self.add(text, (), fg, stack)
+
+    def add_template(
+            self,
+            template: MessageTemplate,
+            args: Tuple[Union[str, int], ...] = (),
+            fg: Tuple[int, int, int] = color.white,
+            *,
+            stack: bool = True,
+    ) -> None:
+        """Add a templated message to this log. It stacks with a previous message of the same template and args."""
+        self.add(template, args, fg, stack)
+
+    def add(
+            self,
+            text: Union[str, MessageTemplate],
+            args: Tuple[Union[str, int], ...],
+            fg: Tuple[int, int, int],
+            stack: bool,
+    ) -> None:
+        if stack and self.messages and self.messages[-1].stacks_with(text, args):
             self.messages[-1].count += 1
         else:
-            self.messages.append(Message(text, fg))
+            if len(self.messages) == self.messages.maxlen:
+                self.spill(self.messages[0])
+            self.messages.append(Message(text, fg, args))
+
+    def spill(self, message: Message) -> None:
+        """Append a message that is about to leave memory to the history file."""
+        if self.history_file is None:
+            return
+        block = self.history_count // HISTORY_INDEX_STRIDE
+        if self.history_count % HISTORY_INDEX_STRIDE == 0:
+            self.history_offsets.append(self.history_size)
+        # The last block grows with this record, so a cached copy of it is out of date
+        self.history_blocks.pop(block, None)
+        record = (json.dumps([message.plain_text, message.fg, message.count]) + "\n").encode()
+        with open(self.history_file, "ab") as f:
+            f.write(record)
+        self.history_size += len(record)
+        self.history_count += 1
+
+    def read_history_block(self, block: int) -> List[Message]:
+        """Read the records of one index block from the history file, caching the last few blocks read."""
+        messages = self.history_blocks.get(block)
+        if messages is not None:
+            return messages
+
+        count = min(HISTORY_INDEX_STRIDE, self.history_count - block * HISTORY_INDEX_STRIDE)
+        messages = []
+        with open(self.history_file, "rb") as f:
+            f.seek(self.history_offsets[block])
+            for _ in range(count):
+                text, fg, stack_count = json.loads(f.readline())
+                message = Message(text, tuple(fg))
+                message.count = stack_count
+                messages.append(message)
+
+        if len(self.history_blocks) >= HISTORY_CACHED_BLOCKS:
+            self.history_blocks.clear()
+        self.history_blocks[block] = messages
+        return messages
+
+    def history(self) -> "MessageHistory":
+        """A read only sequence of every message, oldest first, that reads the history file only as needed."""
+        return MessageHistory(self)
 
     def render(
             self, console: tcod.Console, x: int, y: int, width: int, height: int,
@@ -76,17 +266,47 @@ class MessageLog:
             y: int,
             width: int,
             height: int,
-            messages: Reversible[Message],
+            messages: Sequence[Message],
+            end: Optional[int] = None,
     ) -> None:
         """Render the messages provided.
         The 'messages' are rendered starting at the last messages and working
-        backwards.
+        backwards. If 'end' is given rendering starts at messages[end - 1] instead,
+        which lets a history view scroll without copying the messages.
+        Only the messages that fit in the area are wrapped.
         """
         y_offset = height - 1
+        if end is None:
+            end = len(messages)
 
-        for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.full_text, width))):
+        for index in range(end - 1, -1, -1):
+            message = messages[index]
+            for line in reversed(message.wrap(width)):
                 console.print(x=x, y=y + y_offset, string=line, fg=message.fg)
                 y_offset -= 1
                 if y_offset < 0:
                     return  # No more space to print messages.
+
+
+class MessageHistory(Sequence[Message]):
+    """
+    Every message of a MessageLog, oldest first. The messages in the history file are read a block at a time
+    when they are first indexed, so paging through a long history only loads the pages shown.
+    """
+
+    def __init__(self, log: MessageLog):
+        self.log = log
+
+    def __len__(self) -> int:
+        return len(self.log)
+
+    def __getitem__(self, index: int) -> Message:  # type: ignore[override]
+        if index < 0:
+            index += len(self.log)
+        if not 0 <= index < len(self.log):
+            raise IndexError(index)
+
+        if index >= self.log.history_count:
+            return self.log.messages[index - self.log.history_count]
+        block, offset = divmod(index, HISTORY_INDEX_STRIDE)
+        return self.log.read_history_block(block)[offset]
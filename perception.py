@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Tuple, TYPE_CHECKING
+
+import numpy as np
+from tcod.map import compute_fov
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+# Fields of view kept before the cache is emptied, so it can't grow without limit as actors wander around
+MAX_CACHED_FIELDS = 256
+
+
+class Perception:
+    """
+    Fields of view for the actors on a GameMap, so that enemies can have their own sight instead of reading the
+    player's visible array.
+
+    A field is computed over only the window of the map its radius can reach, and kept keyed by
+    (x, y, radius) until the map's tiles_version changes. Actors standing on the same tile with the same radius
+    share one field. compute_many() works out the fields for a whole turn's worth of actors in one pass.
+    """
+
+    def __init__(self, game_map: GameMap):
+        self.game_map = game_map
+        self.tiles_version = game_map.tiles_version
+        # (x, y, radius) to the x and y of the window's corner and the visible tiles within the window
+        self.fields: Dict[Tuple[int, int, int], Tuple[int, int, np.ndarray]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> dict:
+        # The fields are only a cache so don't put them in save files
+        state = self.__dict__.copy()
+        state["fields"] = {}
+        return state
+
+    def check_version(self) -> None:
+        """Throw away every field if the map's tiles have changed since they were computed."""
+        if self.tiles_version != self.game_map.tiles_version or len(self.fields) > MAX_CACHED_FIELDS:
+            self.fields.clear()
+            self.tiles_version = self.game_map.tiles_version
+
+    def compute(self, x: int, y: int, radius: int) -> Tuple[int, int, np.ndarray]:
+        """Compute the field of view from x, y over the window of the map within radius of it."""
+        x1 = max(0, x - radius)
+        y1 = max(0, y - radius)
+        x2 = min(self.game_map.width, x + radius + 1)
+        y2 = min(self.game_map.height, y + radius + 1)
+        transparent = self.game_map.tiles["transparent"][x1:x2, y1:y2]
+        return x1, y1, compute_fov(transparent, (x - x1, y - y1), radius=radius)
+
+    def compute_many(self, viewers: Iterable[Tuple[int, int, int]]) -> None:
+        """
+        Make sure the field of every (x, y, radius) in viewers is cached, computing each missing one only once.
+        """
+        self.check_version()
+        for key in set(viewers):
+            if key not in self.fields:
+                self.misses += 1
+                self.fields[key] = self.compute(*key)
+
+    def field_of_view(self, x: int, y: int, radius: int) -> Tuple[int, int, np.ndarray]:
+        """Return the cached field of view from x, y as (window x, window y, visible tiles of the window)."""
+        self.check_version()
+        key = (x, y, radius)
+        field = self.fields.get(key)
+        if field is None:
+            self.misses += 1
+            field = self.fields[key] = self.compute(x, y, radius)
+        else:
+            self.hits += 1
+        return field
+
+    def can_see(self, x: int, y: int, radius: int, target_x: int, target_y: int) -> bool:
+        """Whether a viewer at x, y with the given sight radius can see the target tile."""
+        x1, y1, visible = self.field_of_view(x, y, radius)
+        local_x = target_x - x1
+        local_y = target_y - y1
+        if not (0 <= local_x < visible.shape[0] and 0 <= local_y < visible.shape[1]):
+            return False
+        return bool(visible[local_x, local_y])
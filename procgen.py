@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import random
-from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING, Optional
+from itertools import islice
+from typing import Dict, Iterable, List, Sequence, Tuple, TYPE_CHECKING, Optional
 
-import tcod
+import numpy as np
 
 import exceptions
 import tile_room_types
@@ -16,45 +17,16 @@ if TYPE_CHECKING:
 import weights
 
 
-def get_max_value_for_floor(
-        max_value_by_floor: List[Tuple[int, int]], floor: int
-) -> int:
-    current_value = 0
-
-    for floor_minimum, value in max_value_by_floor:
-        if floor_minimum > floor:
-            break
-        else:
-            current_value = value
-
-    return current_value
+def get_max_value_for_floor(max_value_by_floor: weights.FloorValue, floor: int) -> int:
+    return max_value_by_floor.for_floor(floor)
 
 
 def get_entities_at_random(
-        weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
+        spawn_table: weights.SpawnTable,
         number_of_entities: int,
         floor: int,
 ) -> List[Entity]:
-    entity_weighted_chances = {}
-
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
-                entity_weighted_chances[entity] = weighted_chance
-
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-
-    chosen_entities = random.choices(
-        entities, weights=entity_weighted_chance_values, k=number_of_entities
-    )
-
-    return chosen_entities
+    return spawn_table.choose(floor, number_of_entities)
 
 
 class RectangularRoom:
@@ -94,43 +66,185 @@ class RectangularRoom:
         )
 
 
+# Random picks tried in a size's free mask before falling back to a list of its free positions
+MAX_RANDOM_PICKS = 32
+
+
+class FreePositions:
+    """
+    The top-left corners a room of one size can still be made at, for RoomPlacer.
+
+    free[i, j] is True while a room at (x_start + i, y_start + j) would overlap no other room, and count is how
+    many are True. While at least 1 in MAX_RANDOM_PICKS positions is free a random free one is found by picking
+    positions at random. Past that the free positions are listed once, and the list is picked from, throwing
+    away positions that have been blocked since as they come up.
+    """
+
+    def __init__(self, x_start: int, y_start: int, x_count: int, y_count: int):
+        self.x_start = x_start
+        self.y_start = y_start
+        self.free = np.ones((max(0, x_count), max(0, y_count)), dtype=bool, order="F")
+        self.count = self.free.size
+        # Filled in once free positions get scarce, the first candidate_count entries are still to be checked
+        self.candidates: Optional[np.ndarray] = None
+        self.candidate_count = 0
+
+    def block(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        """Mark the corners from x1, y1 to x2, y2 (exclusive), in map coordinates, as taken."""
+        window = (
+            slice(max(0, x1 - self.x_start), max(0, x2 - self.x_start)),
+            slice(max(0, y1 - self.y_start), max(0, y2 - self.y_start)),
+        )
+        self.count -= int(np.count_nonzero(self.free[window]))
+        self.free[window] = False
+
+    def pick(self) -> Optional[Tuple[int, int]]:
+        """A random free corner in map coordinates, or None if there are none."""
+        if not self.count:
+            return None
+        x_count, y_count = self.free.shape
+        if self.candidates is None:
+            for _ in range(MAX_RANDOM_PICKS):
+                x = random.randrange(x_count)
+                y = random.randrange(y_count)
+                if self.free[x, y]:
+                    return self.x_start + x, self.y_start + y
+            self.candidates = np.argwhere(self.free)
+            self.candidate_count = len(self.candidates)
+
+        # Every free corner is in the candidates since they only ever get blocked, so this finds one
+        while True:
+            index = random.randrange(self.candidate_count)
+            x, y = self.candidates[index]
+            if self.free[x, y]:
+                return self.x_start + int(x), self.y_start + int(y)
+            self.candidate_count -= 1
+            self.candidates[index] = self.candidates[self.candidate_count]
+
+
+class RoomPlacer:
+    """
+    Finds space for new rooms without testing each candidate against every room.
+
+    A room occupies its full rectangle, walls included, from x1, y1 to x2, y2 inclusive, which is the same overlap
+    test RectangularRoom.intersects() uses. For each room size asked for, a FreePositions keeps which top-left
+    corners are still free. Adding a room only blocks the corners in the window it overlaps, for each size, so the
+    cost of a room depends on its size and the number of sizes rather than on the size of the map.
+    """
+
+    def __init__(self, width: int, height: int, padding: int = 0):
+        """
+        :param padding: rows kept free of rooms at the top and at the bottom of the map
+        """
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.rooms: List[RectangularRoom] = []
+        self.free_positions: Dict[Tuple[int, int], FreePositions] = {}
+
+    def add(self, room: RectangularRoom) -> None:
+        """Mark a room's rectangle as taken."""
+        self.rooms.append(room)
+        for size, positions in self.free_positions.items():
+            self.block(room, size, positions)
+
+    @staticmethod
+    def block(room: RectangularRoom, size: Tuple[int, int], positions: FreePositions) -> None:
+        # A room of this size at x, y covers the tiles x to x + width and y to y + height
+        room_width, room_height = size
+        positions.block(room.x1 - room_width, room.y1 - room_height, room.x2 + 1, room.y2 + 1)
+
+    def get_free_positions(self, room_width: int, room_height: int) -> FreePositions:
+        """
+        The free top-left corners for rooms of this size, with x in [0, width - room_width - 1] and y within the
+        padding, the same ranges generation used to pick from.
+        """
+        size = room_width, room_height
+        positions = self.free_positions.get(size)
+        if positions is None:
+            positions = self.free_positions[size] = FreePositions(
+                0,
+                self.padding,
+                self.width - room_width,
+                self.height - room_height - 2 * self.padding,
+            )
+            for room in self.rooms:
+                self.block(room, size, positions)
+        return positions
+
+    def fits(self, room_width: int, room_height: int) -> bool:
+        """Whether a room of this size fits anywhere."""
+        return self.get_free_positions(room_width, room_height).count > 0
+
+    def find_position(self, room_width: int, room_height: int) -> Optional[Tuple[int, int]]:
+        """Pick a random free x, y for a room of this size, or None if it fits nowhere."""
+        return self.get_free_positions(room_width, room_height).pick()
+
+
 def place_entities(
-        room: RectangularRoom,
+        rooms: Sequence[RectangularRoom],
         dungeon: GameMap,
         floor_number: int,
         place_monters: bool = True,
         place_items: bool = True
 ) -> None:
+    """
+    Spawn a random number of monsters and items in each room.
+    The entities for every room are drawn together, one batch of monsters and one of items.
+    """
     # todo: remove monsters
-    items: List[Entity] = []
-    monsters: List[Entity] = []
+    monster_counts = [0] * len(rooms)
+    item_counts = [0] * len(rooms)
     if place_monters:
-        number_of_monsters = random.randint(
-            0, get_max_value_for_floor(weights.max_monsters_by_floor, floor_number)
-        )
-        monsters = get_entities_at_random(
-            weights.enemy_chances, number_of_monsters, floor_number
-        )
+        max_monsters = get_max_value_for_floor(weights.max_monsters, floor_number)
+        monster_counts = [random.randint(0, max_monsters) for _ in rooms]
     if place_items:
-        number_of_items = random.randint(
-            0, get_max_value_for_floor(weights.max_items_by_floor, floor_number)
-        )
-        items = get_entities_at_random(
-            weights.item_chances, number_of_items, floor_number
-        )
+        max_items = get_max_value_for_floor(weights.max_items, floor_number)
+        item_counts = [random.randint(0, max_items) for _ in rooms]
+
+    monsters = iter(get_entities_at_random(weights.enemy_table, sum(monster_counts), floor_number))
+    items = iter(get_entities_at_random(weights.item_table, sum(item_counts), floor_number))
+    for room, number_of_monsters, number_of_items in zip(rooms, monster_counts, item_counts):
+        entities = list(islice(monsters, number_of_monsters)) + list(islice(items, number_of_items))
+        place_in_room(room, dungeon, entities)
+
+
+def place_in_room(room: RectangularRoom, dungeon: GameMap, entities: List[Entity]) -> None:
+    """Spawn a copy of each entity on its own free tile in the room."""
+    # Only a room with fewer free tiles than entities spawns fewer
+    free_cells = get_free_cells(room, dungeon)
+    chosen = random.sample(range(len(free_cells)), min(len(entities), len(free_cells)))
+    x_slice, y_slice = room.inner
+    room_width = x_slice.stop - x_slice.start
+    for entity, cell in zip(entities, free_cells[chosen]):
+        y, x = divmod(int(cell), room_width)
+        entity.spawn(dungeon, x_slice.start + x, y_slice.start + y)
+
+
+def get_free_cells(room: RectangularRoom, dungeon: GameMap) -> np.ndarray:
+    """
+    Return the tiles inside the room that have no entity on them, as flat indexes into the room's inner area.
+    A flat index is x + y * the inner width, with x and y relative to the inner area's top left corner.
+    """
+    x_slice, y_slice = room.inner
+    occupied = np.zeros((x_slice.stop - x_slice.start, y_slice.stop - y_slice.start), dtype=bool, order="F")
+    store = dungeon.entity_store
+    in_room = np.flatnonzero(store.within_area_mask(room.inner))
+    occupied[store.x[in_room] - x_slice.start, store.y[in_room] - y_slice.start] = True
+    return np.flatnonzero(~occupied.ravel(order="F"))
 
-    for entity in monsters + items:
-        x = random.randint(room.x1 + 1, room.x2 - 1)
-        y = random.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-            entity.spawn(dungeon, x, y)
+def segment(start: Tuple[int, int], end: Tuple[int, int]) -> Tuple[slice, slice]:
+    """Return the straight line between two points that share an x or a y as a 2D array index, ends included."""
+    x1, y1 = start
+    x2, y2 = end
+    return slice(min(x1, x2), max(x1, x2) + 1), slice(min(y1, y2), max(y1, y2) + 1)
 
 
-def tunnel_between(
+def tunnel_segments(
         start: Tuple[int, int], end: Tuple[int, int]
-) -> Iterator[Tuple[int, int]]:
-    """Return an L-shaped tunnel between these two points."""
+) -> Tuple[Tuple[slice, slice], Tuple[slice, slice]]:
+    """Return an L-shaped tunnel between these two points as its two straight legs."""
     x1, y1 = start
     x2, y2 = end
     if random.random() < 0.5:  # 50% chance.
@@ -140,11 +254,7 @@ def tunnel_between(
         # Move vertically, then horizontally.
         corner_x, corner_y = x1, y2
 
-    # Generate the coordinates for this tunnel.
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    return segment(start, (corner_x, corner_y)), segment((corner_x, corner_y), end)
 
 
 def generate_dungeon(
@@ -212,6 +322,7 @@ def generate_dungeon(
     y = 1
     height = padding - 2
     width = enemy_spawn_interval // 2
+    enemy_spawns: List[RectangularRoom] = []
     for i in range(enemy_spawn_rooms):
         # create the spawn room
         midpoint = enemy_spawn_interval // 2 + (i * enemy_spawn_interval)  # also width +
@@ -223,11 +334,13 @@ def generate_dungeon(
             height=height,
             type=tile_room_types.RoomTypes.ENEMY_SPAWN
         )
-        dungeon.tiles[spawn_room.inner] = tile_room_types.spawn_floor_enemy
+        dungeon.set_tiles(spawn_room.inner, tile_room_types.spawn_floor_enemy)
+        dungeon.add_room(spawn_room)
         # Connect it to the main land
         dungeon = connect_spawn(spawn_room, dungeon, True, 2)
-        # Place enemies
-        place_entities(room=spawn_room, dungeon=dungeon,floor_number=engine.game_world.current_floor, place_items=False)
+        enemy_spawns.append(spawn_room)
+    # Place enemies
+    place_entities(rooms=enemy_spawns, dungeon=dungeon, floor_number=engine.game_world.current_floor, place_items=False)
 
     friendly_interval = map_width // friendly_spawn_rooms
     quarter_interval = friendly_interval // 4
@@ -244,7 +357,8 @@ def generate_dungeon(
             height=height,
             type=tile_room_types.RoomTypes.FRIENDY_SPAWN
         )
-        dungeon.tiles[spawn_room.inner] = tile_room_types.spawn_floor_friendly
+        dungeon.set_tiles(spawn_room.inner, tile_room_types.spawn_floor_friendly)
+        dungeon.add_room(spawn_room)
         dungeon = connect_spawn(spawn_room, dungeon, False, 2)
 
     return dungeon
@@ -254,6 +368,8 @@ def connect_spawn(room: RectangularRoom, dungeon: GameMap, is_enemy: bool, tunne
     """
     Connect a spawn room with the rest of the dungeon.
     If is_enemy is true then the movement is down for making a tunnel
+    The room should already be added to the dungeon with add_room(). If the tunnel ends inside another room the two
+    are linked in the room graph.
     :param tunnel_ratio: as a ratio the length of the dungeon to climb when looking for a tunnel. Cannot equal 0
     :return: Will return the modified map
     """
@@ -275,6 +391,7 @@ def connect_spawn(room: RectangularRoom, dungeon: GameMap, is_enemy: bool, tunne
         last = i
         if dungeon.tiles[start[0], i] == tile_room_types.floor:
             # we have found our needed location so dig here
+            link_spawn(room, (start[0], i), dungeon)
             return tunnel(start, (start[0], i), dungeon)  # hopefully this works backwards
 
     dungeon = tunnel(start, (start[0], last), dungeon)
@@ -298,6 +415,7 @@ def connect_spawn(room: RectangularRoom, dungeon: GameMap, is_enemy: bool, tunne
         if i >= dungeon.width or i < 0:
             continue
         if dungeon.tiles[i, new_start[1]] == tile_room_types.floor:
+            link_spawn(room, (i, new_start[1]), dungeon)
             return tunnel(new_start, (i, new_start[1]), dungeon)
 
     print("No room was found. Giving up is not the best play")
@@ -305,11 +423,31 @@ def connect_spawn(room: RectangularRoom, dungeon: GameMap, is_enemy: bool, tunne
     return dungeon
 
 
+def link_spawn(room: RectangularRoom, end: Tuple[int, int], dungeon: GameMap) -> None:
+    """Link a spawn room in the room graph to the room its tunnel ends in, if it ends in one."""
+    end_room = dungeon.get_room_at(*end)
+    if end_room >= 0:
+        dungeon.connect_rooms(dungeon.get_room_at(*room.center), end_room)
+
+
 def tunnel(
         point1: Tuple[int, int], point2: Tuple[int, int], d: GameMap
 ) -> GameMap:
-    for x, y in tunnel_between(point1, point2):
-        d.tiles[x, y] = tile_room_types.floor
+    for leg in tunnel_segments(point1, point2):
+        d.set_tiles(leg, tile_room_types.floor)
+    return d
+
+
+def carve_tunnels(
+        tunnels: Iterable[Tuple[Tuple[int, int], Tuple[int, int]]], d: GameMap
+) -> GameMap:
+    """Dig an L-shaped tunnel between each pair of points, writing them all to the map in one go."""
+    mask = np.zeros((d.width, d.height), dtype=bool, order="F")
+    for point1, point2 in tunnels:
+        for leg in tunnel_segments(point1, point2):
+            mask[leg] = True
+    if mask.any():
+        d.set_tiles(mask, tile_room_types.floor)
     return d
 
 
@@ -346,22 +484,25 @@ def padded_generation(
     dungeon = GameMap(engine, map_width, map_height, entities=[])
 
     rooms: List[RectangularRoom] = []
+    tunnels: List[Tuple[Tuple[int, int], Tuple[int, int]]] = []
+    placer = RoomPlacer(map_width, map_height, padding_total // 2)
 
     for r in range(max_rooms):
         room_width = random.randint(room_min_size, room_max_size)
         room_height = random.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0 + padding_total // 2, dungeon.height - room_height - 1 - padding_total // 2)
-
-        new_room = make_room(x, y, room_width, room_height, tile_room_types.RoomTypes.REGULAR)
+        # Only positions where the room can't intersect another are picked from
+        position = placer.find_position(room_width, room_height)
+        if position is None:
+            if not placer.fits(room_min_size, room_min_size):
+                break  # Not even the smallest room fits anywhere
+            continue
 
-        # Run through the other rooms and see if they intersect with this one.
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            continue  # This room intersects, so go to the next attempt.
-        # If there are no intersections then the room is valid.
+        new_room = make_room(*position, room_width, room_height, tile_room_types.RoomTypes.REGULAR)
+        placer.add(new_room)
 
-        dungeon.tiles[new_room.inner] = tile_room_types.floor
+        dungeon.set_tiles(new_room.inner, tile_room_types.floor)
+        room_id = dungeon.add_room(new_room)
 
         # if len(rooms) == 0:
         #     # The first room, where the player starts.
@@ -372,22 +513,23 @@ def padded_generation(
         #         dungeon.tiles[x, y] = tile_room_types.floor
 
         if len(rooms) > 0:
-            # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_room_types.floor
+            # Dig out a tunnel between this room and the previous one, once every room is placed
+            tunnels.append((rooms[-1].center, new_room.center))
+            dungeon.connect_rooms(room_id - 1, room_id)
 
         place_player_center(engine, dungeon)
-        place_entities(
-            room=new_room,
-            dungeon=dungeon,
-            floor_number=engine.game_world.current_floor,
-            place_monters=False
-        )
 
         # Can add stairs here if needed. Will be added to final room
         # Finally, append the new room to the list.
         rooms.append(new_room)
 
+    carve_tunnels(tunnels, dungeon)
+    place_entities(
+        rooms=rooms,
+        dungeon=dungeon,
+        floor_number=engine.game_world.current_floor,
+        place_monters=False
+    )
     return dungeon
 
 
@@ -405,6 +547,7 @@ def default_generation(
     dungeon = GameMap(engine, map_width, map_height, entities=[player])
 
     rooms: List[RectangularRoom] = []
+    placer = RoomPlacer(map_width, map_height)
 
     center_of_last_room = (0, 0)
 
@@ -412,18 +555,20 @@ def default_generation(
         room_width = random.randint(room_min_size, room_max_size)
         room_height = random.randint(room_min_size, room_max_size)
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+        # Only positions where the room can't intersect another are picked from
+        position = placer.find_position(room_width, room_height)
+        if position is None:
+            if not placer.fits(room_min_size, room_min_size):
+                break  # Not even the smallest room fits anywhere
+            continue
 
         # "RectangularRoom" class makes rectangles easier to work with
-        new_room = make_room(x, y, room_width, room_height)
-        # Run through the other rooms and see if they intersect with this one.
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            continue  # This room intersects, so go to the next attempt.
-        # If there are no intersections then the room is valid.
+        new_room = make_room(*position, room_width, room_height)
+        placer.add(new_room)
 
         # Dig out this rooms inner area.
-        dungeon.tiles[new_room.inner] = tile_room_types.floor
+        dungeon.set_tiles(new_room.inner, tile_room_types.floor)
+        room_id = dungeon.add_room(new_room)
 
         if len(rooms) == 0:
             # The first room, where the player starts.
@@ -431,22 +576,21 @@ def default_generation(
         else:  # All rooms after the first.
             # Dig out a tunnel between this room and the previous one.
             tunnel(rooms[-1].center, new_room.center, dungeon)
+            dungeon.connect_rooms(room_id - 1, room_id)
             center_of_last_room = new_room.center
 
-        place_entities(new_room, dungeon, engine.game_world.current_floor)
-
-        dungeon.tiles[center_of_last_room] = tile_room_types.down_stairs
+        dungeon.set_tiles(center_of_last_room, tile_room_types.down_stairs)
         dungeon.downstairs_location = center_of_last_room
 
         # Finally, append the new room to the list.
         rooms.append(new_room)
 
+    place_entities(rooms, dungeon, engine.game_world.current_floor)
     return dungeon
 
 
 def place_player_center(engine: Engine, dungeon: GameMap) -> None:
     player = engine.player
-    dungeon.entities.add(player)
     player.place(
         dungeon.width // 2,
         dungeon.height // 2,
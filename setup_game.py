@@ -1,7 +1,6 @@
 """Handle the loading and initialization of game sessions."""
 from __future__ import annotations
 
-import copy
 import traceback
 from typing import Optional
 
@@ -9,7 +8,7 @@ import tcod
 
 import entity_factories
 import input_handlers
-from config import SAVE_LOCATION
+from config import FOV_RADIUS, HISTORY_LOCATION, SAVE_LOCATION
 from engine import Engine
 from entity import Actor
 # from game_map import GameWorld
@@ -37,8 +36,8 @@ def game_specific_setup(player: Actor) -> None:
     :rtype: None
     """
 
-    dagger = copy.deepcopy(entity_factories.dagger)
-    leather_armor = copy.deepcopy(entity_factories.leather_armor)
+    dagger = entity_factories.dagger.clone()
+    leather_armor = entity_factories.leather_armor.clone()
 
     dagger.parent = player.inventory
     leather_armor.parent = player.inventory
@@ -75,9 +74,9 @@ def new_game(
     :returns: the Engine object to run the game
     """
 
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.clone()
 
-    engine = Engine(player=player)
+    engine = Engine(player=player, history_file=HISTORY_LOCATION)
 
     engine.game_world = GameWorld(
         engine=engine,
@@ -86,11 +85,11 @@ def new_game(
         room_max_size=room_max_size,
         map_width=map_width,
         map_height=map_height,
-
+        pregenerate=True,
     )
 
     engine.game_world.generate_floor()
-    engine.update_fov(1000)
+    engine.update_fov(FOV_RADIUS)
 
     engine.message_log.add_message(
         get_welcome_message(), color.welcome_text
@@ -0,0 +1,108 @@
+"""
+Consistency checks for the state GameMap keeps up to date as the game runs. These are not run by the game itself.
+Run from the project root with:
+
+```
+python test.py
+```
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import random
+import tempfile
+
+import benchmarks
+import procgen
+import tile_room_types
+from actions import DropItem, PickupAction
+from config import FOV_RADIUS
+from engine import Engine
+from game_map import GameMap
+from message_log import MessageLog
+
+
+def new_engine() -> Engine:
+    """Build an engine with benchmarks.new_engine and generate its first floor, without floor pregeneration."""
+    engine = benchmarks.new_engine()
+    engine.game_world.generate_floor()
+    engine.update_fov(FOV_RADIUS)
+    return engine
+
+
+def test_path_cost(seed: int = 0, turns: int = 30) -> None:
+    """
+    Generate a floor with check_path_cost set, so every pathfinding call compares the maintained path cost grid
+    against a full rebuild, then play it: enemy turns, deaths, pickups, drops, carving and a save and load.
+    """
+    random.seed(seed)
+    GameMap.check_path_cost = True
+    try:
+        engine = new_engine()
+        game_map = engine.game_map
+        game_map.verify_path_cost()
+
+        for _ in range(turns):
+            engine.handle_enemy_turns()
+        game_map.verify_path_cost()
+
+        # Deaths stop actors blocking movement
+        enemies = [actor for actor in game_map.actors if actor is not engine.player]
+        for actor in enemies[: len(enemies) // 2]:
+            actor.fighter.die()
+        game_map.verify_path_cost()
+
+        # Pick up the nearest item the player can stand on, then drop it again
+        player = engine.player
+        item = next(item for item in game_map.items if not game_map.get_blocking_entity_at_location(item.x, item.y))
+        game_map.move_entity(player, item.x, item.y)
+        PickupAction(player).perform()
+        DropItem(player, item).perform()
+        game_map.verify_path_cost()
+
+        # Carve tunnels through the map, including under actors, and wall a tile back up
+        centers = [room.center for room in game_map.rooms]
+        procgen.carve_tunnels(zip(centers, reversed(centers)), game_map)
+        actor = next(actor for actor in game_map.actors if actor is not player)
+        game_map.set_tiles((actor.x, actor.y), tile_room_types.wall)
+        game_map.verify_path_cost()
+
+        for _ in range(turns):
+            engine.handle_enemy_turns()
+        game_map.verify_path_cost()
+
+        # The grids are left out of save files and rebuilt on first use after loading
+        loaded = pickle.loads(pickle.dumps(engine))
+        for _ in range(turns):
+            loaded.handle_enemy_turns()
+        loaded.game_map.verify_path_cost()
+    finally:
+        GameMap.check_path_cost = False
+
+
+def test_history_cache() -> None:
+    """
+    A history block read while it was only partly written must not be reused once more messages have been spilled
+    into it.
+    """
+    handle, history_file = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        log = MessageLog(capacity=10, history_file=history_file)
+        for i in range(80):
+            log.add_message(f"message {i}")
+        assert log.history()[68].plain_text == "message 68"
+        for i in range(80, 100):
+            log.add_message(f"message {i}")
+        assert log.history()[85].plain_text == "message 85"
+        assert [message.plain_text for message in log.history()] == [f"message {i}" for i in range(100)]
+    finally:
+        os.remove(history_file)
+
+
+if __name__ == "__main__":
+    for seed in range(5):
+        test_path_cost(seed)
+    test_history_cache()
+    print("ok")
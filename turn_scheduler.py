@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterator, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+# How much time passes each time the player takes a turn. An actor with the default speed of 100 acts once per turn.
+TURN_LENGTH = 100
+
+
+class TurnScheduler:
+    """
+    Energy based turn order for the live, non player actors on a map.
+    Actors sit in a heap keyed by the time they next act so each turn only touches the actors that are acting.
+    An actor's speed decides how often it acts: speed 200 acts twice per turn, speed 50 every other turn.
+
+    Entries are lists of [time, sequence, actor] so that an actor can be unscheduled by blanking its entry,
+    the blanked entry is then thrown away when it reaches the top of the heap.
+    """
+
+    def __init__(self) -> None:
+        self.time = 0
+        self.heap: List[list] = []
+        self.entries: Dict[Actor, list] = {}
+        # Tie breaker so actors due at the same time act in the order they were scheduled
+        self.sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self.entries
+
+    def schedule(self, actor: Actor, time: int) -> None:
+        """Schedule an actor to act at the given time, replacing any previous entry it had."""
+        self.unschedule(actor)
+        entry = [time, self.sequence, actor]
+        self.sequence += 1
+        self.entries[actor] = entry
+        heapq.heappush(self.heap, entry)
+
+    def add(self, actor: Actor) -> None:
+        """Start giving a new actor turns. It first acts after one of its own turn lengths has passed."""
+        self.schedule(actor, self.time + self.delay(actor))
+
+    def unschedule(self, actor: Actor) -> None:
+        """Stop giving an actor turns, for example because it died or left the map."""
+        entry = self.entries.pop(actor, None)
+        if entry is not None:
+            entry[-1] = None
+
+    @staticmethod
+    def delay(actor: Actor) -> int:
+        """Time between an actor's turns."""
+        return max(1, TURN_LENGTH * 100 // actor.speed)
+
+    def peek_due(self) -> List[Actor]:
+        """The actors that the next actors_due() will yield, each listed once, without advancing time."""
+        due_time = self.time + TURN_LENGTH
+        due: Dict[Actor, None] = {}
+        # Walk down the heap from the top, a child is never due sooner than its parent
+        pending = [0] if self.heap else []
+        while pending:
+            index = pending.pop()
+            time, _, actor = self.heap[index]
+            if time > due_time:
+                continue
+            if actor is not None:
+                due[actor] = None
+            pending.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(self.heap))
+        return list(due)
+
+    def actors_due(self) -> Iterator[Actor]:
+        """
+        Advance time by one player turn and yield each actor whose turn comes up, in turn order.
+        Fast actors can be yielded more than once.
+        """
+        self.time += TURN_LENGTH
+        while self.heap and self.heap[0][0] <= self.time:
+            time, _, actor = heapq.heappop(self.heap)
+            if actor is None:
+                continue  # Unscheduled
+            # Reschedule first so the actor can safely be unscheduled while it acts
+            self.schedule(actor, time + self.delay(actor))
+            yield actor
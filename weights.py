@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import bisect
+import random
+from itertools import accumulate
 from typing import Dict, List, Tuple, TYPE_CHECKING
 
 import entity_factories
@@ -7,6 +10,61 @@ import entity_factories
 if TYPE_CHECKING:
     from entity import Entity
 
+
+class FloorValue:
+    """
+    A value that changes with the floor number, from a list of (floor_minimum, value) sorted by floor_minimum.
+    Each floor's value is found once, with a binary search, and kept.
+    """
+
+    def __init__(self, value_by_floor: List[Tuple[int, int]]):
+        self.floor_minimums = [floor_minimum for floor_minimum, _ in value_by_floor]
+        self.values = [value for _, value in value_by_floor]
+        self.by_floor: Dict[int, int] = {}
+
+    def for_floor(self, floor: int) -> int:
+        """The value of the last entry whose floor_minimum is at most floor, 0 if there isn't one."""
+        value = self.by_floor.get(floor)
+        if value is None:
+            index = bisect.bisect_right(self.floor_minimums, floor)
+            value = self.by_floor[floor] = self.values[index - 1] if index else 0
+        return value
+
+
+class SpawnTable:
+    """
+    Weighted chances of spawning each entity, from a dict of floor_minimum to a list of (entity, weight) sorted by
+    floor_minimum. On a floor every entry up to it counts and a later weight for an entity replaces the earlier one.
+
+    Each floor is compiled once into its entities and their cumulative weights, so drawing costs a binary search
+    per entity however many kinds the table has.
+    """
+
+    def __init__(self, chances_by_floor: Dict[int, List[Tuple[Entity, int]]]):
+        self.chances_by_floor = chances_by_floor
+        self.samplers: Dict[int, Tuple[List[Entity], List[int]]] = {}
+
+    def compile(self, floor: int) -> Tuple[List[Entity], List[int]]:
+        """Return the entities that can spawn on the floor and their cumulative weights."""
+        sampler = self.samplers.get(floor)
+        if sampler is None:
+            weighted_chances: Dict[Entity, int] = {}
+            for floor_minimum, chances in self.chances_by_floor.items():
+                if floor_minimum > floor:
+                    break
+                for entity, weighted_chance in chances:
+                    weighted_chances[entity] = weighted_chance
+            sampler = self.samplers[floor] = list(weighted_chances), list(accumulate(weighted_chances.values()))
+        return sampler
+
+    def choose(self, floor: int, number_of_entities: int) -> List[Entity]:
+        """Draw number_of_entities templates for the floor, with replacement."""
+        entities, cumulative_weights = self.compile(floor)
+        if not entities:
+            return []
+        return random.choices(entities, cum_weights=cumulative_weights, k=number_of_entities)
+
+
 max_items_by_floor = [
     (1, 25),
     (4, 35),
@@ -31,3 +89,9 @@ enemy_chances: Dict[int, List[Tuple[Entity, int]]] = {
     5: [(entity_factories.troll, 30)],
     7: [(entity_factories.troll, 60)],
 }
+
+# Compiled from the tables above, use these while generating floors
+max_items = FloorValue(max_items_by_floor)
+max_monsters = FloorValue(max_monsters_by_floor)
+item_table = SpawnTable(item_chances)
+enemy_table = SpawnTable(enemy_chances)